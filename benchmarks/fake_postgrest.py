@@ -0,0 +1,329 @@
+# benchmarks/fake_postgrest.py
+# PostgREST falso en memoria para los benchmarks: sirve `units` y
+# `historial_conversaciones_diarias` con la misma API que usa database.py
+# (filtros eq./gt./gte./lt./lte./in./is., or=(...)/and(...) anidados, order,
+# select con agregados count()/sum() (o 400 PGRST123 con --no-aggregates),
+# limit/offset, max-rows (1000 como Supabase), Prefer: count=exact ->
+# Content-Range, POST/PATCH/DELETE).
+# La latencia por petición es configurable para simular la red hasta Supabase.
+#
+# Uso: python benchmarks/fake_postgrest.py [--port 8765] [--units 10000]
+#                                          [--messages 20000] [--latency-ms 20] [--max-rows 1000]
+#                                          [--no-aggregates]
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATUSES = ["Disponible", "Reservada", "Vendida"]
+TYPOLOGIES = ["Studio", "1BR", "2BR", "3BR", "Penthouse"]
+WORDS = [
+    "hola", "precio", "departamento", "tulum", "playa", "carmen", "crédito", "entrega",
+    "amenidades", "alberca", "vista", "mar", "enganche", "mensualidades", "disponible",
+    "recámaras", "metros", "visita", "ubicación", "preventa", "financiamiento", "renta",
+]
+
+
+# =====================================================
+#   DATOS
+# =====================================================
+
+def make_units(n: int, project_ids):
+    rnd = random.Random(7)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+            "project_id": project_ids[i % len(project_ids)],
+            "unit_identifier": f"U-{i:06d}",
+            "typology": rnd.choice(TYPOLOGIES),
+            "level": str(rnd.randint(1, 20)),
+            "total_area_sqm": round(rnd.uniform(35, 250), 2),
+            "status": rnd.choice(STATUSES),
+            "delivery_date": rnd.choice(["2025-Q4", "2026-Q1", "2026-Q2"]),
+            "price_list_url": None,
+            "created_at": base.isoformat(),
+            # Algunas sin updated_at, como en la tabla real (cola de nulos del cursor)
+            "updated_at": None if i % 50 == 49 else (base + timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def make_messages(n: int, users: int = 50, days: int = 60):
+    rnd = random.Random(11)
+    today = date.today()
+    return [
+        {
+            "id": i + 1,
+            "fecha": (today - timedelta(days=rnd.randrange(days))).isoformat(),
+            "idusuario": (u := rnd.randrange(users)),
+            "nombreusuario": f"usuario{u}",
+            "historial_conversacion": " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(8, 40))),
+        }
+        for i in range(n)
+    ]
+
+
+# =====================================================
+#   FILTROS POSTGREST
+# =====================================================
+
+_COMPARE = {
+    "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+}
+
+
+def _compile(column, expr):
+    """Predicado fila -> bool para `column=op.valor` (se arma una vez por petición)."""
+    op, _, value = expr.partition(".")
+    if op == "in":
+        allowed = set(value.strip("()").split(","))
+        return lambda row: str(row.get(column)) in allowed
+    if op == "is":
+        if value == "null":
+            return lambda row: row.get(column) is None
+        return lambda row: str(row.get(column)).lower() == value
+    compare = _COMPARE.get(op)
+    if compare is None:
+        return lambda row: True
+    value = value.strip('"')
+    return lambda row: row.get(column) is not None and compare(str(row.get(column)), value)
+
+
+def _split_top_level(expr: str):
+    """'a.eq.1,and(b.gt.2,c.lt.3)' -> ['a.eq.1', 'and(b.gt.2,c.lt.3)']"""
+    parts, depth, current = [], 0, ""
+    for ch in expr:
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _compile_logic(op: str, inner: str):
+    predicates = [_compile_condition(part) for part in _split_top_level(inner)]
+    if op == "or":
+        return lambda row: any(p(row) for p in predicates)
+    return lambda row: all(p(row) for p in predicates)
+
+
+def _compile_condition(condition: str):
+    for op in ("or", "and"):
+        if condition.startswith(op + "("):
+            return _compile_logic(op, condition[len(op) + 1:-1])
+    column, _, expr = condition.partition(".")
+    return _compile(column, expr)
+
+
+def apply_filters(rows, query: dict):
+    for column, values in query.items():
+        if column in ("select", "order", "limit", "offset", "on_conflict"):
+            continue
+        for expr in values:
+            if column in ("or", "and"):
+                predicate = _compile_logic(column, expr[1:-1])
+            else:
+                predicate = _compile(column, expr)
+            rows = [r for r in rows if predicate(r)]
+    return rows
+
+
+_AGGREGATE = re.compile(r"^(?:(\w+):)?(?:(\w+)\.)?(count|sum|avg|min|max)\(\)$")
+
+
+def apply_select(rows, select: str):
+    """select=col,... y agregados de PostgREST 12 (count(), col.sum(), ...) agrupando por el resto."""
+    columns = select.split(",")
+    aggregates = [(c, _AGGREGATE.match(c)) for c in columns]
+    if not any(m for _, m in aggregates):
+        return [{c: r.get(c) for c in columns} for r in rows]
+    keys = [c for c, m in aggregates if not m]
+    groups = {}
+    for r in rows:
+        groups.setdefault(tuple(r.get(k) for k in keys), []).append(r)
+    result = []
+    for group_key, group in groups.items():
+        out = dict(zip(keys, group_key))
+        for _, m in aggregates:
+            if not m:
+                continue
+            alias, column, fn = m.groups()
+            values = [r.get(column) for r in group if r.get(column) is not None] if column else group
+            out[alias or fn] = {
+                "count": lambda v: len(v), "sum": sum, "min": min, "max": max,
+                "avg": lambda v: sum(v) / len(v),
+            }[fn](values) if values or fn == "count" else None
+        result.append(out)
+    return result
+
+
+def apply_order(rows, order: str):
+    for part in reversed(order.split(",")):
+        column, _, direction = part.partition(".")
+        rows = sorted(rows, key=lambda r: (r.get(column) is None, str(r.get(column))),
+                      reverse=direction.startswith("desc"))
+    return rows
+
+
+# =====================================================
+#   SERVIDOR
+# =====================================================
+
+class FakePostgREST:
+    def __init__(self, units: int = 10_000, messages: int = 20_000, latency_ms: float = 0.0,
+                 project_ids=None, max_rows: int = 1000, aggregates: bool = True):
+        project_ids = project_ids or [str(uuid.UUID(int=i + 1)) for i in range(max(1, units // 100))]
+        self.tables = {
+            "units": make_units(units, project_ids),
+            "historial_conversaciones_diarias": make_messages(messages),
+        }
+        self.latency = latency_ms / 1000
+        self.max_rows = max_rows
+        self.aggregates = aggregates
+        self.lock = threading.Lock()
+        self.server = None
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _parse(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlparse(self.path)
+                table = url.path.rsplit("/", 1)[-1]
+                if table not in fake.tables:
+                    self._send(404, {"message": f"relation {table} does not exist"})
+                    return None, None
+                return table, parse_qs(url.query)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length)) if length else None
+
+            def do_GET(self):
+                table, query = self._parse()
+                if table is None:
+                    return
+                with fake.lock:
+                    rows = apply_filters(fake.tables[table], query)
+                if "order" in query:
+                    rows = apply_order(rows, query["order"][0])
+                # Como PostgREST: limit/offset se aplican al resultado ya agrupado
+                if not fake.aggregates and any(_AGGREGATE.match(c) for c in query.get("select", [""])[0].split(",")):
+                    self._send(400, {"code": "PGRST123", "details": None, "hint": None,
+                                     "message": "Use of aggregate functions is not allowed"})
+                    return
+                if "select" in query and query["select"][0] != "*":
+                    rows = apply_select(rows, query["select"][0])
+                total = len(rows)
+                offset = int(query.get("offset", ["0"])[0])
+                limit = int(query["limit"][0]) if "limit" in query else None
+                if fake.max_rows:
+                    # max-rows recorta en silencio, pida lo que pida el cliente
+                    limit = fake.max_rows if limit is None else min(limit, fake.max_rows)
+                rows = rows[offset:offset + limit if limit is not None else None]
+                headers = {}
+                if "count=" in self.headers.get("Prefer", ""):
+                    headers["Content-Range"] = f"{offset}-{offset + len(rows) - 1}/{total}" if rows else f"*/{total}"
+                self._send(200, rows, headers)
+
+            def do_POST(self):
+                table, query = self._parse()
+                if table is None:
+                    return
+                payload = self._body()
+                rows = payload if isinstance(payload, list) else [payload]
+                now = datetime.now(timezone.utc).isoformat()
+                created = [dict({"id": str(uuid.uuid4()), "created_at": now, "updated_at": now}, **r) for r in rows]
+                with fake.lock:
+                    fake.tables[table].extend(created)
+                self._send(201, created)
+
+            def do_PATCH(self):
+                table, query = self._parse()
+                if table is None:
+                    return
+                changes = self._body() or {}
+                with fake.lock:
+                    rows = apply_filters(fake.tables[table], query)
+                    for row in rows:
+                        row.update(changes, updated_at=datetime.now(timezone.utc).isoformat())
+                self._send(200, rows)
+
+            def do_DELETE(self):
+                table, query = self._parse()
+                if table is None:
+                    return
+                with fake.lock:
+                    doomed = {id(r) for r in apply_filters(fake.tables[table], query)}
+                    fake.tables[table] = [r for r in fake.tables[table] if id(r) not in doomed]
+                self._send(204)
+
+        return Handler
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Arranca en un hilo; devuelve la URL base (puerto libre si port=0)."""
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PostgREST falso para benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--units", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--max-rows", type=int, default=1000, help="max-rows de PostgREST (0 = sin tope)")
+    parser.add_argument("--no-aggregates", action="store_true",
+                        help="como db-aggregates-enabled=false (default de Supabase): 400 PGRST123")
+    args = parser.parse_args()
+
+    fake = FakePostgREST(args.units, args.messages, args.latency_ms, max_rows=args.max_rows,
+                         aggregates=not args.no_aggregates)
+    print(f"PostgREST falso en {fake.start(port=args.port)} "
+          f"({args.units} unidades, {args.messages} mensajes, {args.latency_ms} ms, max-rows {args.max_rows})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# benchmarks/load.py
+# Prueba de carga de la API completa: levanta `main:app` con uvicorn contra una
+# BD1 local (BENCH_DB1_URL, sembrada con seed_db1.py) y un PostgREST falso
+# (fake_postgrest.py) para Supabase, y golpea cada router a concurrencia fija.
+# Reporta por endpoint p50/p95/p99, peticiones por segundo y RSS pico del
+# proceso del servidor, en JSON, para comparar entre versiones.
+#
+# Sin BENCH_DB1_URL solo se miden los endpoints que no tocan BD1 (unidades y
+# las estadísticas de WhatsApp que leen solo de Supabase).
+#
+# Uso: BENCH_DB1_URL=postgresql://postgres@localhost/miki_bench \
+#      python benchmarks/load.py [--concurrency 16] [--requests 400] [--latency-ms 20]
+#                                [--units 10000] [--messages 20000] [--max-rows 1000] [--seed]
+#                                [--only units] [--output resultados.json]
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+
+
+# =====================================================
+#   ESCENARIOS
+# =====================================================
+
+def scenarios(ids: dict):
+    """
+    (nombre, método, ruta, body, usa_bd1). Los proyectos se miden por listado y
+    búsqueda: GET /projects/{id} espera un UUID y la tabla usa ids enteros.
+    Por lo mismo el resumen no puede unir esos ids con units (UUID): mide BD1
+    y la respuesta, con los agregados en null (unit_stats_unmatched_projects_total).
+    """
+    unit, project = ids["unit_id"], ids["project_id"]
+    return [
+        ("zones.list", "GET", "/api/zones/", None, True),
+        ("zones.get", "GET", "/api/zones/1", None, True),
+        ("zones.update", "PUT", "/api/zones/1", {"description": "bench"}, True),
+        ("projects.list", "GET", "/api/projects/?limit=100", None, True),
+        ("projects.search", "GET", "/api/projects/?search=Marina", None, True),
+        ("projects.summary", "GET", "/api/projects/summary/?limit=100", None, True),
+        ("users.list", "GET", "/api/users/", None, True),
+        ("users.get", "GET", "/api/users/1", None, True),
+        ("dashboard.stats", "GET", "/api/dashboard/stats/", None, True),
+        ("dashboard.activity", "GET", "/api/dashboard/activity/", None, True),
+        ("dashboard.whatsapp_summary", "GET", "/api/dashboard/whatsapp/summary/", None, True),
+        ("dashboard.whatsapp_faq", "GET", "/api/dashboard/whatsapp/faq/?days=7", None, True),
+        ("dashboard.whatsapp_daily", "GET", "/api/dashboard/whatsapp/daily/", None, False),
+        ("dashboard.whatsapp_by_user", "GET", "/api/dashboard/whatsapp/by-user/", None, False),
+        ("units.page", "GET", "/api/units/?limit=1000", None, False),
+        ("units.get", "GET", f"/api/units/{unit}", None, False),
+        ("units.by_project", "GET", f"/api/units/project/{project}", None, False),
+        ("units.export", "GET", f"/api/units/export?project_id={project}", None, False),
+        ("units.update", "PATCH", f"/api/units/{unit}", {"status": "Reservada"}, False),
+    ]
+
+
+# =====================================================
+#   PROCESOS (PostgREST falso + servidor de la app)
+# =====================================================
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {timeout:.0f} s")
+
+
+def start_fake_postgrest(args) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_postgrest.py"), "--port", str(port),
+        "--units", str(args.units), "--messages", str(args.messages), "--latency-ms", str(args.latency_ms),
+        "--max-rows", str(args.max_rows),
+    ], stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/rest/v1/units?limit=1")
+    return proc, url
+
+
+def start_app(postgrest_url: str, db1_url: str) -> tuple:
+    port = free_port()
+    env = dict(os.environ,
+               SUPABASE_URL=postgrest_url, SUPABASE_APIKEY="bench", SUPABASE_BEARER="bench",
+               SUPABASE2_URL=postgrest_url, SUPABASE2_APIKEY="bench")
+    if db1_url:
+        env["DB1_URL"] = db1_url
+    else:
+        env.pop("DB1_URL", None)
+    proc = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{url}/api/health/cache")
+    return proc, url
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+class RSSSampler:
+    """Muestrea VmRSS de /proc/<pid>/status (Linux); pico por ventana y global."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.path = f"/proc/{pid}/status"
+        self.interval = interval
+        self.window_peak = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def read_kb(self) -> int:
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self.read_kb()
+            self.window_peak = max(self.window_peak, rss)
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def reset_window(self):
+        self.window_peak = self.read_kb()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# =====================================================
+#   CARGA
+# =====================================================
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Rango más cercano
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client: httpx.AsyncClient, method: str, path: str, body, total: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args, app_url: str, sampler: RSSSampler, use_db1: bool):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=60.0) as client:
+        first = (await client.get("/api/units/?limit=1")).json()[0]
+        ids = {"unit_id": first["id"], "project_id": first["project_id"]}
+
+        results = []
+        for name, method, path, body, needs_db1 in scenarios(ids):
+            if needs_db1 and not use_db1:
+                continue
+            if args.only and not any(part in name for part in args.only):
+                continue
+            await run_scenario(client, method, path, body, args.warmup, args.concurrency)
+            sampler.reset_window()
+            latencies, errors, elapsed = await run_scenario(
+                client, method, path, body, args.requests, args.concurrency)
+            latencies.sort()
+            ms = [v * 1000 for v in latencies]
+            result = {
+                "name": name,
+                "method": method,
+                "path": path,
+                "requests": len(ms),
+                "errors": errors,
+                "rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+                "latency_ms": {
+                    "p50": round(percentile(ms, 50), 2),
+                    "p95": round(percentile(ms, 95), 2),
+                    "p99": round(percentile(ms, 99), 2),
+                    "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+                    "max": round(ms[-1], 2) if ms else 0.0,
+                },
+                "peak_rss_mb": round(sampler.window_peak / 1024, 1),
+            }
+            results.append(result)
+            print(f"{name:32s} {result['rps']:>8} req/s  p50 {result['latency_ms']['p50']:>8} ms  "
+                  f"p99 {result['latency_ms']['p99']:>8} ms  err {errors}", file=sys.stderr)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de Miki.ai")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="peticiones medidas por endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="peticiones de calentamiento por endpoint")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latencia simulada de Supabase")
+    parser.add_argument("--units", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--max-rows", type=int, default=1000, help="max-rows del PostgREST falso (0 = sin tope)")
+    parser.add_argument("--seed", action="store_true", help="volver a sembrar BD1 antes de medir")
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=2_000)
+    parser.add_argument("--db1-units", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="solo escenarios cuyo nombre contenga alguno de estos textos")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    db1_url = os.getenv("BENCH_DB1_URL")
+    if args.seed:
+        if not db1_url:
+            sys.exit("--seed requiere BENCH_DB1_URL")
+        sys.path.insert(0, BENCH_DIR)
+        import seed_db1
+        seed_db1.seed(db1_url, args.zones, args.projects, args.db1_units, args.users)
+
+    fake_proc, postgrest_url = start_fake_postgrest(args)
+    try:
+        app_proc, app_url = start_app(postgrest_url, db1_url)
+        sampler = RSSSampler(app_proc.pid).start()
+        try:
+            results = asyncio.run(run(args, app_url, sampler, bool(db1_url)))
+        finally:
+            sampler.stop()
+            stop(app_proc)
+    finally:
+        stop(fake_proc)
+
+    report = {
+        "config": {
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "supabase_latency_ms": args.latency_ms,
+            "supabase_units": args.units,
+            "supabase_messages": args.messages,
+            "db1": bool(db1_url),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "server_peak_rss_mb": round(sampler.peak / 1024, 1),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
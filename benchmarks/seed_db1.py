@@ -0,0 +1,130 @@
+# benchmarks/seed_db1.py
+# Crea y llena una BD1 local (Postgres) para los benchmarks, a escala configurable.
+# El esquema reproduce las columnas que usa crud.py (zones, projects, users y la
+# tabla units que leen los KPIs y la actividad del dashboard).
+#
+# BORRA los datos de esas tablas: solo usar contra una base de pruebas.
+#
+# Uso: BENCH_DB1_URL=postgresql://postgres@localhost/miki_bench \
+#      python benchmarks/seed_db1.py [--zones 50] [--projects 2000] [--units 20000] [--users 200]
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS zones (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        zone_id INTEGER REFERENCES zones (id) ON DELETE SET NULL,
+        zone INTEGER,
+        general_field_id TEXT,
+        prices_field_id TEXT,
+        developer TEXT,
+        total_units INTEGER DEFAULT 0,
+        created_at TIMESTAMPTZ DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        role TEXT,
+        password_hash TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS units (
+        id UUID PRIMARY KEY,
+        project_id INTEGER REFERENCES projects (id) ON DELETE CASCADE,
+        unit_identifier TEXT,
+        status TEXT,
+        updated_at TIMESTAMPTZ DEFAULT now()
+    )
+    """,
+]
+
+STATUSES = ["Disponible", "Reservada", "Vendida"]
+DEVELOPERS = ["Desarrollos del Caribe", "Constructora Moderna", "Island Developers", "Grupo Riviera"]
+NAME_WORDS = ["Residencial", "Torres", "Paradise", "Marina", "Bay", "Selva", "Cenote", "Luna", "Sol", "Vista"]
+
+
+def seed(url: str, zones: int, projects: int, units: int, users: int):
+    rnd = random.Random(3)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    conn = psycopg2.connect(url)
+    try:
+        with conn.cursor() as cur:
+            for statement in SCHEMA:
+                cur.execute(statement)
+            cur.execute("TRUNCATE units, projects, zones, users RESTART IDENTITY CASCADE")
+
+            execute_values(cur, "INSERT INTO zones (name, description) VALUES %s",
+                           [(f"Zona {i}", f"Zona de prueba {i}") for i in range(zones)], page_size=1000)
+
+            project_rows = []
+            for i in range(projects):
+                zone_id = rnd.randint(1, zones) if zones else None
+                name = f"{rnd.choice(NAME_WORDS)} {rnd.choice(NAME_WORDS)} {i}"
+                project_rows.append((
+                    name, zone_id, zone_id, f"gf-{i}", f"pf-{i}", rnd.choice(DEVELOPERS),
+                    rnd.randint(10, 300), base + timedelta(minutes=i),
+                ))
+            execute_values(cur, """
+                INSERT INTO projects (name, zone_id, zone, general_field_id, prices_field_id,
+                                      developer, total_units, created_at)
+                VALUES %s
+            """, project_rows, page_size=1000)
+
+            if projects:
+                execute_values(cur, """
+                    INSERT INTO units (id, project_id, unit_identifier, status, updated_at) VALUES %s
+                """, [
+                    (str(uuid.UUID(int=rnd.getrandbits(128), version=4)), rnd.randint(1, projects),
+                     f"U-{i:06d}", rnd.choice(STATUSES), base + timedelta(seconds=i * 7))
+                    for i in range(units)
+                ], page_size=1000)
+
+            execute_values(cur, "INSERT INTO users (username, role, password_hash) VALUES %s",
+                           [(f"usuario{i}", rnd.choice(["admin", "agent", "viewer"]), "x" * 60)
+                            for i in range(users)], page_size=1000)
+            cur.execute("ANALYZE zones, projects, units, users")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Llena una BD1 local para benchmarks")
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=2_000)
+    parser.add_argument("--units", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DB1_URL")
+    if not url:
+        sys.exit("BENCH_DB1_URL no está configurado (se exige aparte de DB1_URL para no borrar datos reales)")
+    start = time.perf_counter()
+    seed(url, args.zones, args.projects, args.units, args.users)
+    print(f"BD1 sembrada en {time.perf_counter() - start:.1f} s: {args.zones} zonas, "
+          f"{args.projects} proyectos, {args.units} unidades, {args.users} usuarios")
+
+
+if __name__ == "__main__":
+    main()
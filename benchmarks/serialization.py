@@ -0,0 +1,92 @@
+# benchmarks/serialization.py
+# Serialización y bytes en la red de una respuesta de 10k unidades:
+# antes (jsonable_encoder + json stdlib, sin compresión) vs después
+# (FastJSONResponse/orjson + gzip/brotli).
+#
+# Uso: python benchmarks/serialization.py [n_unidades] [repeticiones]
+
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import responses
+
+
+def make_units(n: int):
+    random.seed(7)
+    projects = [uuid.uuid4() for _ in range(max(1, n // 100))]
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    statuses = ["Disponible", "Reservada", "Vendida"]
+    typologies = ["Studio", "1BR", "2BR", "3BR", "Penthouse"]
+    return [
+        {
+            "id": uuid.uuid4(),
+            "project_id": random.choice(projects),
+            "unit_identifier": f"U-{i:05d}",
+            "typology": random.choice(typologies),
+            "level": str(random.randint(1, 20)),
+            "total_area_sqm": Decimal(str(round(random.uniform(35, 250), 2))),
+            "status": random.choice(statuses),
+            "delivery_date": random.choice(["2025-Q4", "2026-Q1", "2026-Q2"]),
+            "price_list_url": None,
+            "created_at": base,
+            "updated_at": base + timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    units = make_units(n)
+
+    before_s, before_body = timed(lambda: JSONResponse(jsonable_encoder(units)).body, repeat)
+    after_s, after_body = timed(lambda: responses.FastJSONResponse(units).body, repeat)
+
+    gzip_s, gzip_body = timed(lambda: gzip.compress(after_body, compresslevel=responses.GZIP_LEVEL), repeat)
+    results = {
+        "units": n,
+        "serialize_ms": {
+            "before_jsonable_encoder_stdlib": round(before_s * 1000, 2),
+            "after_fastjson": round(after_s * 1000, 2),
+            "speedup": round(before_s / after_s, 1),
+        },
+        "bytes_on_wire": {
+            "before_identity": len(before_body),
+            "after_identity": len(after_body),
+            "after_gzip": len(gzip_body),
+        },
+        "compress_ms": {"gzip": round(gzip_s * 1000, 2)},
+        "orjson": responses.orjson is not None,
+    }
+    if responses.brotli is not None:
+        br_s, br_body = timed(lambda: responses.brotli.compress(after_body, quality=responses.BROTLI_QUALITY), repeat)
+        results["bytes_on_wire"]["after_brotli"] = len(br_body)
+        results["compress_ms"]["brotli"] = round(br_s * 1000, 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
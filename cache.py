@@ -0,0 +1,141 @@
+# cache.py
+# Caché en memoria (por proceso) para lecturas que cambian poco.
+# TTL por entidad, desalojo LRU por tamaño y contadores de hit/miss.
+# Las escrituras de crud.py invalidan el namespace afectado.
+
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+
+# TTL (segundos) por entidad; 0 desactiva la caché de esa entidad
+CACHE_TTLS = {
+    "zones": float(os.getenv("CACHE_TTL_ZONES", "300")),
+    "projects": float(os.getenv("CACHE_TTL_PROJECTS", "60")),
+    "users": float(os.getenv("CACHE_TTL_USERS", "60")),
+    "units": float(os.getenv("CACHE_TTL_UNITS", "30")),
+}
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def get(self, namespace: str, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end((namespace, key))
+                self.hits[namespace] = self.hits.get(namespace, 0) + 1
+                return entry[1]
+            if entry is not None:
+                del self._data[(namespace, key)]
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return _MISSING
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def set(self, namespace: str, key, value, ttl: float, generation: int):
+        with self._lock:
+            # Una escritura invalidó mientras se leía: no guardar el valor viejo
+            if self._generations.get(namespace, 0) != generation:
+                return
+            self._data[(namespace, key)] = (time.monotonic() + ttl, value)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *namespaces: str):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for k in [k for k in self._data if k[0] in namespaces]:
+                del self._data[k]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_entries": self.maxsize,
+                "evictions": self.evictions,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+_cache = TTLCache(CACHE_MAX_ENTRIES)
+
+
+def cached(namespace: str):
+    """
+    Read-through para funciones `fn(conn, ...)` de crud.py.
+    La clave son los argumentos (sin `conn`) normalizados con sus defaults.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ttl = CACHE_TTLS.get(namespace, 0)
+            if ttl <= 0:
+                return fn(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (fn.__name__,) + tuple((k, v) for k, v in bound.arguments.items() if k != "conn")
+
+            value = _cache.get(namespace, key)
+            if value is _MISSING:
+                generation = _cache.generation(namespace)
+                value = fn(*args, **kwargs)
+                _cache.set(namespace, key, value, ttl, generation)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate(*namespaces: str):
+    _cache.invalidate(*namespaces)
+
+
+# Acceso directo para valores que no salen de una función de crud
+# (p. ej. los ETag que guarda etag.py por URL)
+
+def generation(namespace: str) -> int:
+    return _cache.generation(namespace)
+
+
+def lookup(namespace: str, key):
+    if CACHE_TTLS.get(namespace, 0) <= 0:
+        return None
+    value = _cache.get(namespace, key)
+    return None if value is _MISSING else value
+
+
+def store(namespace: str, key, value, generation: int):
+    ttl = CACHE_TTLS.get(namespace, 0)
+    if ttl > 0:
+        _cache.set(namespace, key, value, ttl, generation)
+
+
+def stats() -> dict:
+    return _cache.stats()
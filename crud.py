@@ -1,35 +1,194 @@
+import os
 import uuid
+import base64
+import json
 from fastapi import HTTPException
+from pydantic import ValidationError
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, execute_values
 from typing import List, Optional
+from datetime import datetime
 import schemas
 import requests
+import cache
+import metrics
+from database import fan_out
+
+
+# ============================================================
+# ============ ESQUEMA AUXILIAR (índices de la app) ===========
+# ============================================================
+
+# Lo aplica database.run_schema_setup al arrancar (main.py)
+SCHEMA_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Sirve ILIKE '%x%', ILIKE 'x%' y similarity() sobre el nombre; y la búsqueda por desarrollador
+    "CREATE INDEX IF NOT EXISTS idx_projects_name_trgm ON projects USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_developer_trgm ON projects USING gin (developer gin_trgm_ops)",
+    # project_count por zona (subconsulta por fila en get_zones/update_zones);
+    # Postgres no indexa las llaves foráneas por su cuenta
+    "CREATE INDEX IF NOT EXISTS idx_projects_zone_id ON projects (zone_id)",
+    # Top-N del feed de actividad por fuente (get_recent_activity)
+    "CREATE INDEX IF NOT EXISTS idx_projects_created_at ON projects (created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_units_updated_at ON units (updated_at DESC)",
+]
+
+
+# ============================================================
+# ============== PAGINACIÓN POR CURSOR (KEYSET) ==============
+# ============================================================
+
+def _encode_cursor(values: dict) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict):
+            raise ValueError
+        return values
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _cursor_after_id(cursor: Optional[str]):
+    if not cursor:
+        return None
+    last_id = _decode_cursor(cursor).get("id")
+    if last_id is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+def page_cursor(rows: list, limit: int) -> Optional[str]:
+    """Cursor opaco para la página siguiente de listas ordenadas por id (None si no hay más)."""
+    if not rows or len(rows) < limit:
+        return None
+    return _encode_cursor({"id": rows[-1]["id"]})
+
+
+# ============================================================
+# ========= ESCRITURA EN UN SOLO ROUND TRIP (RETURNING) =======
+# ============================================================
+
+def _write_one(conn, query: str, params: tuple, returning: bool = True):
+    """
+    Ejecuta una escritura de un solo statement. Si la conexión no tiene
+    transacción abierta se corre en autocommit: sin BEGIN/COMMIT extra, un
+    solo round trip. Devuelve la fila de RETURNING (o None) o el rowcount.
+    """
+    idle = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    if idle:
+        conn.autocommit = True
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            result = cur.fetchone() if returning else cur.rowcount
+        if not idle:
+            conn.commit()
+        return result
+    finally:
+        if idle:
+            conn.autocommit = False
+
+def _set_clause(update_data: dict):
+    return ", ".join([f"{key} = %s" for key in update_data.keys()])
+
+
+# ============================================================
+# ============ ACTUALIZACIÓN EN LOTE (UPDATE ... FROM VALUES) =
+# ============================================================
+
+# Columnas editables en lote y su tipo SQL (para tipar el VALUES)
+ZONE_BATCH_COLUMNS = {"name": "text", "description": "text"}
+PROJECT_BATCH_COLUMNS = {
+    "name": "text",
+    "zone_id": "integer",
+    "general_field_id": "text",
+    "prices_field_id": "text",
+}
+
+def _batch_update(conn, table: str, columns: dict, items, select_sql: str):
+    """
+    Un solo UPDATE para todas las filas. Cada columna lleva una bandera
+    `set_<col>` para distinguir "no enviado" de "null". Si algún id no
+    existe se revierte todo y responde 404.
+    """
+    if not items:
+        return []
+
+    names = list(columns)
+    returning = ", ".join(["t.id"] + [f"t.{c}" for c in names])
+    set_clause = ", ".join(f"{c} = CASE WHEN v.set_{c} THEN v.{c} ELSE t.{c} END" for c in names)
+    aliases = ", ".join(["id"] + [f"{c}, set_{c}" for c in names])
+    template = "(" + ", ".join(["%s::integer"] + [f"%s::{columns[c]}, %s::boolean" for c in names]) + ")"
+
+    values = []
+    for item in items:
+        data = item.model_dump(exclude_unset=True)
+        row = [item.id]
+        for c in names:
+            row.extend([data.get(c), c in data])
+        values.append(tuple(row))
+
+    ids = {item.id for item in items}
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        rows = execute_values(cur, f"""
+            WITH upd AS (
+                UPDATE {table} t SET {set_clause}
+                FROM (VALUES %s) AS v({aliases})
+                WHERE t.id = v.id
+                RETURNING {returning}
+            )
+            {select_sql}
+        """, values, template=template, page_size=500, fetch=True)
+
+        missing = ids - {r["id"] for r in rows}
+        if missing:
+            conn.rollback()
+            raise HTTPException(status_code=404, detail=f"Not found: {sorted(missing)}")
+        conn.commit()
+        cache.invalidate("zones", "projects")
+        return rows
 
 
 # ============================================================
 # =================== CRUD PARA ZONAS =========================
 # ============================================================
 
+# Lecturas de zonas/proyectos pasan por cache.py; toda escritura invalida
+# ambos namespaces porque zone_name y project_count cruzan entidades.
+
+@cache.cached("zones")
 def get_zone(conn, zone_id: int):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("SELECT id, name, description FROM zones WHERE id = %s", (zone_id,))
         return cur.fetchone()
 
-def get_zones(conn, skip: int = 0, limit: int = 100):
+@cache.cached("zones")
+def get_zones(conn, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    # Se pagina zones primero y project_count se cuenta solo para la página
+    after_id = _cursor_after_id(cursor)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
+        query = """
             SELECT 
                 z.id,
                 z.name,
                 z.description,
-                COUNT(p.id) AS project_count
+                (SELECT COUNT(*) FROM projects p WHERE p.zone_id = z.id) AS project_count
             FROM zones z
-            LEFT JOIN projects p ON p.zone_id = z.id
-            GROUP BY z.id, z.name, z.description
-            ORDER BY z.id ASC
-            LIMIT %s OFFSET %s
-        """, (limit, skip))
+        """
+        params = []
+
+        if after_id is not None:
+            query += " WHERE z.id > %s ORDER BY z.id ASC LIMIT %s"
+            params.extend([after_id, limit])
+        else:
+            query += " ORDER BY z.id ASC LIMIT %s OFFSET %s"
+            params.extend([limit, skip])
+
+        cur.execute(query, tuple(params))
         return cur.fetchall()
 
 def update_zone(conn, zone_id: int, zone: schemas.ZoneUpdate):
@@ -37,32 +196,48 @@ def update_zone(conn, zone_id: int, zone: schemas.ZoneUpdate):
     if not update_data:
         return get_zone(conn, zone_id)
 
-    set_clause = ", ".join([f"{key} = %s" for key in update_data.keys()])
     values = list(update_data.values())
     values.append(zone_id)
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(f"UPDATE zones SET {set_clause} WHERE id = %s", tuple(values))
-        conn.commit()
-    
-    return get_zone(conn, zone_id)
+    row = _write_one(conn, f"""
+        UPDATE zones SET {_set_clause(update_data)} WHERE id = %s
+        RETURNING id, name, description
+    """, tuple(values))
+    cache.invalidate("zones", "projects")
+    return row
 
 def delete_zone(conn, zone_id: int):
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM zones WHERE id = %s", (zone_id,))
-        deleted = cur.rowcount
-        conn.commit()
-        return deleted
+    deleted = _write_one(conn, "DELETE FROM zones WHERE id = %s", (zone_id,), returning=False)
+    cache.invalidate("zones", "projects")
+    return deleted
 
 def create_zone(conn, zone: schemas.ZoneCreate):
+    row = _write_one(conn, """
+        INSERT INTO zones (name, description) VALUES (%s, %s)
+        RETURNING id, name, description
+    """, (zone.name, zone.description))
+    cache.invalidate("zones", "projects")
+    return row
+
+def create_zones(conn, zones: List[schemas.ZoneCreate]):
+    if not zones:
+        return []
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            "INSERT INTO zones (name, description) VALUES (%s, %s) RETURNING id",
-            (zone.name, zone.description)
-        )
-        new_id = cur.fetchone()["id"]
+        rows = execute_values(cur, """
+            INSERT INTO zones (name, description) VALUES %s
+            RETURNING id, name, description, 0 AS project_count
+        """, [(z.name, z.description) for z in zones], page_size=500, fetch=True)
         conn.commit()
-        return get_zone(conn, new_id)
+        cache.invalidate("zones", "projects")
+        return rows
+
+def update_zones(conn, zones: List[schemas.ZoneBatchUpdate]):
+    return _batch_update(conn, "zones", ZONE_BATCH_COLUMNS, zones, """
+        SELECT u.id, u.name, u.description,
+               (SELECT COUNT(*) FROM projects p WHERE p.zone_id = u.id) AS project_count
+        FROM upd u
+        ORDER BY u.id
+    """)
 
 
 
@@ -70,6 +245,7 @@ def create_zone(conn, zone: schemas.ZoneCreate):
 # ================= CRUD PARA PROYECTOS =======================
 # ============================================================
 
+@cache.cached("projects")
 def get_project(conn, project_id: uuid.UUID):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
@@ -86,7 +262,35 @@ def get_project(conn, project_id: uuid.UUID):
         """, (project_id,))
         return cur.fetchone()
 
-def get_projects(conn, skip: int = 0, limit: int = 100, search: str = ""):
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# similarity() solo existe con pg_trgm, y run_schema_setup solo avisa si no
+# pudo crear la extensión: se comprueba una vez y sin ella se ordena sin similarity()
+_trgm_state = {"available": None}
+
+def _has_trgm(conn) -> bool:
+    if _trgm_state["available"] is None:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS available")
+            _trgm_state["available"] = bool(cur.fetchone()["available"])
+        if not _trgm_state["available"]:
+            print("Advertencia: pg_trgm no está instalado en BD1; la búsqueda de proyectos no ordena por similarity()")
+    return _trgm_state["available"]
+
+@cache.cached("projects")
+def get_projects(conn, skip: int = 0, limit: int = 100, search: str = "", cursor: Optional[str] = None,
+                 prefix: bool = False):
+    """
+    Con `search` filtra por nombre, desarrollador o nombre de zona (índices
+    trigram) y ordena por relevancia: primero los nombres que empiezan con el
+    término, luego los que lo contienen, luego por similarity() del nombre
+    (si hay pg_trgm). `prefix` solo devuelve coincidencias al inicio.
+    La búsqueda pagina con skip/limit.
+    """
+    if search and cursor:
+        raise HTTPException(status_code=400, detail="cursor no se puede combinar con search")
+    after_id = _cursor_after_id(cursor)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         query = """
             SELECT 
@@ -100,60 +304,117 @@ def get_projects(conn, skip: int = 0, limit: int = 100, search: str = ""):
             LEFT JOIN zones z ON p.zone_id = z.id
         """
 
+        conditions = []
         params = []
 
         if search:
-            query += " WHERE p.name ILIKE %s"
-            params.append(f"%{search}%")
+            pattern = _like_escape(search) + "%"
+            if not prefix:
+                pattern = "%" + pattern
+            # OR solo sobre columnas de projects: cada rama usa su índice (BitmapOr)
+            conditions.append("(p.name ILIKE %s OR p.developer ILIKE %s"
+                              " OR p.zone_id IN (SELECT id FROM zones WHERE name ILIKE %s))")
+            params.extend([pattern] * 3)
+
+        if after_id is not None:
+            conditions.append("p.id > %s")
+            params.append(after_id)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
 
-        query += " ORDER BY p.id ASC LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
+        if search:
+            query += " ORDER BY p.name ILIKE %s DESC, p.name ILIKE %s DESC, "
+            params.extend([_like_escape(search) + "%", "%" + _like_escape(search) + "%"])
+            if _has_trgm(conn):
+                query += "similarity(p.name, %s) DESC, "
+                params.append(search)
+            query += "p.id ASC LIMIT %s OFFSET %s"
+            params.extend([limit, skip])
+        elif after_id is not None:
+            query += " ORDER BY p.id ASC LIMIT %s"
+            params.append(limit)
+        else:
+            query += " ORDER BY p.id ASC LIMIT %s OFFSET %s"
+            params.extend([limit, skip])
 
         cur.execute(query, tuple(params))
         return cur.fetchall()
 
+# La CTE hace el JOIN de zone_name en el mismo statement que escribe
 def create_project(conn, project: schemas.ProjectCreate):
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        query = """
+    row = _write_one(conn, """
+        WITH ins AS (
             INSERT INTO projects (name, zone_id, general_field_id, prices_field_id)
             VALUES (%s, %s, %s, %s)
-            RETURNING id
-        """
-        cur.execute(query, (
-            project.name,
-            project.zone_id,
-            project.general_field_id,
-            project.prices_field_id
-        ))
-        new_id = cur.fetchone()["id"]
-        conn.commit()
-        return get_project(conn, new_id)
+            RETURNING id, name, zone_id, general_field_id, prices_field_id
+        )
+        SELECT ins.*, z.name AS zone_name
+        FROM ins
+        LEFT JOIN zones z ON ins.zone_id = z.id
+    """, (
+        project.name,
+        project.zone_id,
+        project.general_field_id,
+        project.prices_field_id
+    ))
+    cache.invalidate("zones", "projects")
+    return row
 
 def update_project(conn, project_id: uuid.UUID, project: schemas.ProjectUpdate):
+    """Devuelve None si el proyecto no existe (el router responde 404)."""
     update_data = project.model_dump(exclude_unset=True)
 
     if not update_data:
         return get_project(conn, project_id)
 
-    set_clause = ", ".join([f"{key} = %s" for key in update_data.keys()])
     values = list(update_data.values())
     values.append(project_id)
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            f"UPDATE projects SET {set_clause} WHERE id = %s",
-            tuple(values)
+    row = _write_one(conn, f"""
+        WITH upd AS (
+            UPDATE projects SET {_set_clause(update_data)} WHERE id = %s
+            RETURNING id, name, zone_id, general_field_id, prices_field_id
         )
+        SELECT upd.*, z.name AS zone_name
+        FROM upd
+        LEFT JOIN zones z ON upd.zone_id = z.id
+    """, tuple(values))
+    cache.invalidate("zones", "projects")
+    return row
+
+def create_projects(conn, projects: List[schemas.ProjectCreate]):
+    if not projects:
+        return []
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        rows = execute_values(cur, """
+            WITH ins AS (
+                INSERT INTO projects (name, zone_id, general_field_id, prices_field_id)
+                VALUES %s
+                RETURNING id, name, zone_id, general_field_id, prices_field_id
+            )
+            SELECT ins.*, z.name AS zone_name
+            FROM ins
+            LEFT JOIN zones z ON ins.zone_id = z.id
+            ORDER BY ins.id
+        """, [(p.name, p.zone_id, p.general_field_id, p.prices_field_id) for p in projects],
+            page_size=500, fetch=True)
         conn.commit()
+        cache.invalidate("zones", "projects")
+        return rows
 
-    return get_project(conn, project_id)
+def update_projects(conn, projects: List[schemas.ProjectBatchUpdate]):
+    return _batch_update(conn, "projects", PROJECT_BATCH_COLUMNS, projects, """
+        SELECT u.*, z.name AS zone_name
+        FROM upd u
+        LEFT JOIN zones z ON u.zone_id = z.id
+        ORDER BY u.id
+    """)
 
 def delete_project(conn, project_id: uuid.UUID):
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM projects WHERE id = %s", (str(project_id),))
-        rowcount = cur.rowcount
-        conn.commit()
-        return rowcount
+    rowcount = _write_one(conn, "DELETE FROM projects WHERE id = %s", (str(project_id),), returning=False)
+    cache.invalidate("zones", "projects")
+    return rowcount
 
 
 
@@ -161,53 +422,108 @@ def delete_project(conn, project_id: uuid.UUID):
 # =================== CRUD DASHBOARD ==========================
 # ============================================================
 
+# Partes de los KPIs (CTEs de get_dashboard_stats): cada tabla se recorre una
+# vez y los estados de unidades salen de conteos condicionales (FILTER)
+DASHBOARD_STATS_PARTS = {
+    "projects": """
+        SELECT
+            COUNT(*) AS total_projects,
+            COALESCE(SUM(total_units), 0) AS total_units,
+            COUNT(DISTINCT developer) AS total_developers
+        FROM projects
+    """,
+    "zones": """
+        SELECT COUNT(*) AS total_zones FROM zones
+    """,
+    "units": """
+        SELECT
+            COUNT(*) FILTER (WHERE status ILIKE 'Disponible') AS available_units,
+            COUNT(*) FILTER (WHERE status ILIKE 'Vendida') AS sold_units,
+            COUNT(*) FILTER (WHERE status ILIKE 'Reservada') AS reserved_units
+        FROM units
+    """,
+}
+
 def get_dashboard_stats(conn):
-    stats = {}
+    # Una sola consulta (las partes como CTEs) en una sola conexión
+    names = [f"{part}_stats" for part in DASHBOARD_STATS_PARTS]
+    ctes = ",\n".join(f"{name} AS ({sql})" for name, sql in zip(names, DASHBOARD_STATS_PARTS.values()))
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT COUNT(*) as total FROM projects")
-        stats['total_projects'] = cur.fetchone()['total']
-        cur.execute("SELECT COALESCE(SUM(total_units), 0) as total FROM projects")
-        stats['total_units'] = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(*) as total FROM zones")
-        stats['total_zones'] = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(*) as total FROM units WHERE status ILIKE 'Disponible'")
-        stats['available_units'] = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(*) as total FROM units WHERE status ILIKE 'Vendida'")
-        stats['sold_units'] = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(*) as total FROM units WHERE status ILIKE 'Reservada'")
-        stats['reserved_units'] = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(DISTINCT developer) as total FROM projects WHERE developer IS NOT NULL")
-        stats['total_developers'] = cur.fetchone()['total']
-    return stats
+        cur.execute(f"WITH {ctes}\nSELECT * FROM {', '.join(names)}")
+        return dict(cur.fetchone())
+
+def get_recent_activity(conn, limit: int = 10, since: Optional[datetime] = None,
+                        cursor: Optional[str] = None):
+    """
+    Feed de actividad (proyectos creados + unidades actualizadas), más reciente primero.
+    Cada fuente aporta solo su top-`limit` por índice (created_at / updated_at) y luego
+    se mezclan: el costo depende de `limit`, no del inventario total.
+      - since:  solo eventos posteriores (polling de novedades)
+      - cursor: página anterior (X-Next-Cursor), keyset sobre (timestamp, type, id)
+    """
+    project_where, project_params = ["p.created_at IS NOT NULL"], []
+    unit_where, unit_params = ["u.updated_at IS NOT NULL"], []
+
+    if since is not None:
+        project_where.append("p.created_at > %s")
+        project_params.append(since)
+        unit_where.append("u.updated_at > %s")
+        unit_params.append(since)
+
+    if cursor:
+        values = _decode_cursor(cursor)
+        try:
+            before = (values["timestamp"], values["type"], str(values["id"]))
+        except KeyError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        project_where.append("p.created_at <= %s AND (p.created_at, 'project', p.id::text) < (%s::timestamptz, %s, %s)")
+        project_params.extend([before[0], *before])
+        unit_where.append("u.updated_at <= %s AND (u.updated_at, 'unit', u.id::text) < (%s::timestamptz, %s, %s)")
+        unit_params.extend([before[0], *before])
 
-def get_recent_activity(conn, limit: int = 10):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT 
-                'project' as type,
-                p.name as title,
-                'Proyecto creado' as action,
-                p.created_at as timestamp,
-                p.developer as description
-            FROM projects p
-            UNION ALL
-            SELECT 
-                'unit' as type,
-                CONCAT(pr.name, ' - ', u.unit_identifier) as title,
-                CASE 
-                    WHEN u.status = 'Vendida' THEN 'Unidad vendida'
-                    WHEN u.status = 'Reservada' THEN 'Unidad reservada'
-                    ELSE 'Unidad actualizada'
-                END as action,
-                u.updated_at as timestamp,
-                u.status as description
-            FROM units u
-            JOIN projects pr ON u.project_id = pr.id
-            ORDER BY timestamp DESC
+        cur.execute(f"""
+            SELECT * FROM (
+                (SELECT 
+                    'project' as type,
+                    p.id::text as id,
+                    p.name as title,
+                    'Proyecto creado' as action,
+                    p.created_at as timestamp,
+                    p.developer as description
+                FROM projects p
+                WHERE {" AND ".join(project_where)}
+                ORDER BY p.created_at DESC, p.id::text DESC
+                LIMIT %s)
+                UNION ALL
+                (SELECT 
+                    'unit' as type,
+                    u.id::text as id,
+                    CONCAT(pr.name, ' - ', u.unit_identifier) as title,
+                    CASE 
+                        WHEN u.status = 'Vendida' THEN 'Unidad vendida'
+                        WHEN u.status = 'Reservada' THEN 'Unidad reservada'
+                        ELSE 'Unidad actualizada'
+                    END as action,
+                    u.updated_at as timestamp,
+                    u.status as description
+                FROM units u
+                JOIN projects pr ON u.project_id = pr.id
+                WHERE {" AND ".join(unit_where)}
+                ORDER BY u.updated_at DESC, u.id::text DESC
+                LIMIT %s)
+            ) activity
+            ORDER BY timestamp DESC, type DESC, id DESC
             LIMIT %s
-        """, (limit,))
+        """, (*project_params, limit, *unit_params, limit, limit))
         return cur.fetchall()
 
+def activity_cursor(rows: list, limit: int) -> Optional[str]:
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return _encode_cursor({"timestamp": last["timestamp"], "type": last["type"], "id": last["id"]})
+
 def get_projects_by_zone(conn):
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
@@ -244,33 +560,44 @@ def get_user(conn, user_id: int):
         cur.execute("SELECT id, username, role, password_hash FROM users WHERE id = %s", (user_id,))
         return cur.fetchone()
 
-def get_users(conn, skip: int = 0, limit: int = 100, role_filter: str = ""):
+def get_users(conn, skip: int = 0, limit: int = 100, role_filter: str = "", cursor: Optional[str] = None):
+    # Orden descendente: la página siguiente es id < último id
+    before_id = _cursor_after_id(cursor)
     with conn.cursor(cursor_factory=RealDictCursor) as cur:
         query = "SELECT * FROM users"
+        conditions = []
         params = []
 
         if role_filter:
-            query += " WHERE role = %s"
+            conditions.append("role = %s")
             params.append(role_filter)
 
-        query += " ORDER BY id DESC LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
+        if before_id is not None:
+            conditions.append("id < %s")
+            params.append(before_id)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        if before_id is not None:
+            query += " ORDER BY id DESC LIMIT %s"
+            params.append(limit)
+        else:
+            query += " ORDER BY id DESC LIMIT %s OFFSET %s"
+            params.extend([limit, skip])
 
         cur.execute(query, tuple(params))
         return cur.fetchall()
 
 def create_user(conn, user: schemas.UserCreate):
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            INSERT INTO users (username, role, password_hash)
-            VALUES (%s, %s, %s)
-            RETURNING id
-        """,
-        (user.username, user.role, user.password))
-        
-        new_id = cur.fetchone()["id"]
-        conn.commit()
-        return get_user(conn, new_id)
+    row = _write_one(conn, """
+        INSERT INTO users (username, role, password_hash)
+        VALUES (%s, %s, %s)
+        RETURNING id, username, role, password_hash
+    """,
+    (user.username, user.role, user.password))
+    cache.invalidate("users")
+    return row
 
 def update_user(conn, user_id: int, user: schemas.UserUpdate):
     update_data = user.model_dump(exclude_unset=True)
@@ -278,25 +605,24 @@ def update_user(conn, user_id: int, user: schemas.UserUpdate):
     if not update_data:
         return get_user(conn, user_id)
 
-    set_clause = ", ".join([f"{key} = %s" for key in update_data.keys()])
+    # El schema expone `password`; la columna es password_hash (igual que create_user)
+    if "password" in update_data:
+        update_data["password_hash"] = update_data.pop("password")
+
     values = list(update_data.values())
     values.append(user_id)
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            f"UPDATE users SET {set_clause} WHERE id = %s",
-            tuple(values)
-        )
-        conn.commit()
-
-    return get_user(conn, user_id)
+    row = _write_one(conn, f"""
+        UPDATE users SET {_set_clause(update_data)} WHERE id = %s
+        RETURNING id, username, role, password_hash
+    """, tuple(values))
+    cache.invalidate("users")
+    return row
 
 def delete_user(conn, user_id: int):
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
-        deleted = cur.rowcount
-        conn.commit()
-        return deleted
+    deleted = _write_one(conn, "DELETE FROM users WHERE id = %s", (user_id,), returning=False)
+    cache.invalidate("users")
+    return deleted
 
 
 
@@ -311,42 +637,337 @@ def _validate_uuid_str(id_str: str):
         raise HTTPException(status_code=400, detail="Invalid UUID")
 
 
-def get_unit(conn, unit_id: str):
+# Las funciones de unidades reciben el cliente async (database.get_db3_async)
+
+
+# Orden estable para paginar unidades: (updated_at, id). Las filas sin
+# updated_at van al final (NULLS LAST) y entre ellas se ordena solo por id
+UNITS_PAGE_ORDER = "updated_at.asc.nullslast,id.asc"
+
+def _units_keyset_filter(cursor: str) -> dict:
+    values = _decode_cursor(cursor)
+    if "updated_at" not in values or not values.get("id"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    updated_at, last_id = values["updated_at"], _validate_uuid_str(values["id"])
+    if updated_at is None:
+        # Ya en la cola de nulos: solo quedan nulos con id mayor
+        return {"updated_at": "is.null", "id": f"gt.{last_id}"}
+    return {"or": f'(updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt.{last_id}),updated_at.is.null)'}
+
+# max-rows de PostgREST (Supabase: 1000): nunca devuelve más filas por petición
+# aunque se pida un limit mayor, así que una página de ese tamaño no es la última
+SUPABASE_MAX_ROWS = int(os.getenv("SUPABASE_MAX_ROWS", "1000"))
+
+def _units_next_cursor(rows: list, limit: int):
+    if len(rows) < min(limit, SUPABASE_MAX_ROWS) or not rows:
+        return None
+    last = rows[-1]
+    return _encode_cursor({"updated_at": last.get("updated_at"), "id": last.get("id")})
+
+async def get_unit(conn, unit_id: str):
     unit_id = _validate_uuid_str(unit_id)
-    rows = conn.select("units", {"id": f"eq.{unit_id}"})
+    rows = await conn.select("units", {"id": f"eq.{unit_id}"})
     return rows[0] if rows else None
 
 
-def get_all_units(conn, skip: int = 0, limit: int = 1000):
-    rows = conn.select("units")
-    return rows[skip: skip + limit]
+async def get_units_page(conn, skip: int = 0, limit: int = 1000, cursor: Optional[str] = None,
+                         params: Optional[dict] = None, with_total: bool = True):
+    """
+    Página de unidades resuelta en PostgREST (limit/offset o keyset).
+    Con `cursor` ignora `skip` y continúa después de (updated_at, id).
+    Devuelve (filas, total, next_cursor); total solo en modo offset.
+    """
+    params = {**(params or {}), "order": UNITS_PAGE_ORDER}
+    if cursor:
+        params.update(_units_keyset_filter(cursor))
+        rows, total = await conn.select_page("units", params, limit=limit, count=None)
+    else:
+        count = "exact" if with_total else None
+        rows, total = await conn.select_page("units", params, offset=skip, limit=limit, count=count)
+    return rows, total, _units_next_cursor(rows, limit)
+
+
+async def _iter_units_pages(conn, params: Optional[dict] = None, chunk_size: int = SUPABASE_MAX_ROWS):
+    cursor = None
+    while True:
+        rows, _, cursor = await get_units_page(conn, limit=chunk_size, cursor=cursor,
+                                                params=params, with_total=False)
+        if rows:
+            yield rows
+        if not cursor:
+            break
+
+
+async def iter_units(conn, project_id: Optional[str] = None, chunk_size: int = 1000):
+    """Recorre unidades por páginas keyset; cada `yield` es una lista de hasta chunk_size filas."""
+    params = {"project_id": f"eq.{_validate_uuid_str(project_id)}"} if project_id else None
+    async for rows in _iter_units_pages(conn, params, chunk_size):
+        yield rows
+
+
+async def get_all_units(conn, skip: int = 0, limit: int = 1000):
+    rows, _, _ = await get_units_page(conn, skip=skip, limit=limit)
+    return rows
 
 
-def get_units_by_project(conn, project_id: str):
+async def get_units_by_project(conn, project_id: str):
     project_id = _validate_uuid_str(project_id)
-    rows = conn.select("units", {"project_id": f"eq.{project_id}"})
+    rows = await conn.select("units", {"project_id": f"eq.{project_id}"})
     return rows
 
 
-def create_unit(conn, unit: schemas.UnitCreate):
-    payload = unit.model_dump() if hasattr(unit, "model_dump") else unit.dict()
-    created = conn.insert("units", payload)
+# Carga por lotes: project_id=in.(...) troceado para no pasar el límite de URL
+# de PostgREST/proxies (un UUID ocupa 36 caracteres + la coma)
+UNITS_IN_FILTER_MAX_CHARS = int(os.getenv("UNITS_IN_FILTER_MAX_CHARS", "6000"))
+
+def _chunk_ids(ids: List[str], max_chars: int):
+    chunk, size = [], 0
+    for id_str in ids:
+        if chunk and size + len(id_str) + 1 > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(id_str)
+        size += len(id_str) + 1
+    if chunk:
+        yield chunk
+
+async def _fan_out_in_chunks(project_ids: List[str], fetch) -> list:
+    """`fetch(filtro in.(...))` por trozo de ids, en paralelo; un resultado por trozo."""
+    return await fan_out(*(
+        fetch(f"in.({','.join(chunk)})")
+        for chunk in _chunk_ids(project_ids, UNITS_IN_FILTER_MAX_CHARS)
+    ))
+
+async def _select_all_units(conn, params: dict) -> list:
+    # Un in.() de ~160 proyectos puede pasar de max-rows: se pagina por keyset
+    rows = []
+    async for page in _iter_units_pages(conn, params):
+        rows.extend(page)
+    return rows
+
+async def _select_units_in(conn, project_ids: List[str], params: dict = None) -> list:
+    """Todas las unidades de los ids (paginadas), una lista de filas por trozo de ids."""
+    return await _fan_out_in_chunks(
+        project_ids, lambda in_filter: _select_all_units(conn, {**(params or {}), "project_id": in_filter}))
+
+async def get_units_by_projects(conn, project_ids) -> dict:
+    """
+    {project_id: [unidades]} para todos los ids pedidos (lista vacía si no tiene).
+    Una consulta paginada por trozo de ids y los trozos en paralelo.
+    """
+    ids = list(dict.fromkeys(_validate_uuid_str(p) for p in project_ids))
+    grouped = {project_id: [] for project_id in ids}
+    if not ids:
+        return grouped
+    pages = await _select_units_in(conn, ids)
+    for rows in pages:
+        for row in rows:
+            grouped.setdefault(str(row.get("project_id")), []).append(row)
+    return grouped
+
+
+# ------------------------------------------------------------
+# Agregados de unidades por proyecto (resumen de proyectos)
+# ------------------------------------------------------------
+
+# Agregado en PostgREST (GROUP BY implícito en las columnas sin función).
+# Requiere db-aggregates-enabled (apagado por defecto en Supabase); si PostgREST
+# responde que no están permitidos se agrupa aquí con columnas mínimas.
+UNITS_PGRST_AGGREGATES = os.getenv("UNITS_PGRST_AGGREGATES", "1") == "1"
+_UNIT_STATS_AGGREGATE_SELECT = "project_id,status,count(),total_area_sqm.sum()"
+_UNIT_STATS_AGGREGATE_ORDER = "project_id.asc,status.asc"
+_UNIT_STATS_RAW_SELECT = "project_id,status,total_area_sqm,updated_at,id"
+_aggregates_state = {"enabled": UNITS_PGRST_AGGREGATES}
+_unmatched_ids_state = {"warned": False}
+
+_STATUS_FIELDS = {
+    "disponible": "available_units",
+    "vendida": "sold_units",
+    "reservada": "reserved_units",
+}
+
+def _empty_unit_stats() -> dict:
+    return {
+        "unit_count": 0,
+        "available_units": 0,
+        "sold_units": 0,
+        "reserved_units": 0,
+        "total_area_sqm": 0.0,
+        "available_area_sqm": 0.0,
+    }
+
+def unknown_unit_stats() -> dict:
+    # Mismas llaves que _empty_unit_stats, en null: "sin dato", no "sin unidades"
+    return dict.fromkeys(_empty_unit_stats(), None)
+
+def _add_unit_stats(stats: dict, status, count: int, area):
+    field = _STATUS_FIELDS.get((status or "").strip().lower())
+    area = float(area or 0)
+    stats["unit_count"] += count
+    stats["total_area_sqm"] += area
+    if field:
+        stats[field] += count
+    if field == "available_units":
+        stats["available_area_sqm"] += area
+
+def _round_areas(stats: dict) -> dict:
+    for entry in stats.values():
+        entry["total_area_sqm"] = round(entry["total_area_sqm"], 2)
+        entry["available_area_sqm"] = round(entry["available_area_sqm"], 2)
+    return stats
+
+def _aggregates_not_allowed(error: HTTPException) -> bool:
+    # PGRST123 "Use of aggregate functions is not allowed": db-aggregates-enabled apagado.
+    # Cualquier otro error (5xx, timeouts, 504 de fan_out) se propaga y no apaga nada
+    return error.status_code == 400 and "PGRST123" in str(error.detail)
+
+async def _select_unit_aggregates(conn, in_filter: str) -> list:
+    # El resultado agrupado también pasa por max-rows: se pagina por offset
+    params = {"select": _UNIT_STATS_AGGREGATE_SELECT, "project_id": in_filter,
+              "order": _UNIT_STATS_AGGREGATE_ORDER}
+    rows, offset = [], 0
+    while True:
+        page, _ = await conn.select_page("units", params, offset=offset, limit=SUPABASE_MAX_ROWS, count=None)
+        rows.extend(page)
+        if len(page) < SUPABASE_MAX_ROWS:
+            return rows
+        offset += len(page)
+
+async def _fetch_unit_stats(conn, project_ids: List[str]) -> dict:
+    stats = {project_id: _empty_unit_stats() for project_id in project_ids}
+    if _aggregates_state["enabled"]:
+        try:
+            pages = await _fan_out_in_chunks(project_ids, lambda in_filter: _select_unit_aggregates(conn, in_filter))
+        except HTTPException as e:
+            if not _aggregates_not_allowed(e):
+                raise
+            # No se vuelve a intentar hasta reiniciar el proceso
+            _aggregates_state["enabled"] = False
+            print(f"Advertencia: PostgREST sin agregados para units, se agrupa en la API ({e.detail})")
+        else:
+            for rows in pages:
+                for row in rows:
+                    entry = stats.setdefault(str(row["project_id"]), _empty_unit_stats())
+                    _add_unit_stats(entry, row.get("status"), int(row.get("count") or 0), row.get("sum"))
+            return _round_areas(stats)
+
+    pages = await _select_units_in(conn, project_ids, {"select": _UNIT_STATS_RAW_SELECT})
+    for rows in pages:
+        for row in rows:
+            entry = stats.setdefault(str(row["project_id"]), _empty_unit_stats())
+            _add_unit_stats(entry, row.get("status"), 1, row.get("total_area_sqm"))
+    return _round_areas(stats)
+
+async def get_unit_stats_by_projects(conn, project_ids) -> dict:
+    """
+    {project_id: agregados} con los ids tal como se pasan. Cada proyecto se cachea por
+    separado en el namespace "units" (lo invalidan las escrituras de unidades);
+    solo los que faltan van a Supabase, en un in.() por trozo.
+    units.project_id es UUID: un id de BD1 que no lo es no se puede unir y
+    devuelve los agregados en null (se cuenta en /metrics y se avisa una vez).
+    """
+    result, missing, unmatched = {}, [], []
+    for project_id in dict.fromkeys(str(p) for p in project_ids):
+        try:
+            key = _validate_uuid_str(project_id)
+        except HTTPException:
+            result[project_id] = unknown_unit_stats()
+            unmatched.append(project_id)
+            continue
+        cached_stats = cache.lookup("units", ("unit_stats", key))
+        if cached_stats is not None:
+            result[project_id] = cached_stats
+        else:
+            missing.append((project_id, key))
+
+    if missing:
+        generation = cache.generation("units")
+        fetched = await _fetch_unit_stats(conn, list(dict.fromkeys(key for _, key in missing)))
+        for project_id, key in missing:
+            cache.store("units", ("unit_stats", key), fetched[key], generation)
+            result[project_id] = fetched[key]
+
+    if unmatched:
+        metrics.UNIT_STATS_UNMATCHED.inc(len(unmatched))
+        if not _unmatched_ids_state["warned"]:
+            _unmatched_ids_state["warned"] = True
+            print(f"Advertencia: ids de proyecto que no son UUID (p. ej. {unmatched[0]!r}); "
+                  "sus agregados de unidades salen en null porque units.project_id es UUID")
+    return result
+
+
+async def create_unit(conn, unit: schemas.UnitCreate):
+    payload = unit.model_dump(mode="json") if hasattr(unit, "model_dump") else unit.dict()
+    created = await conn.insert("units", payload)
+    cache.invalidate("units")
     return created[0] if isinstance(created, list) and created else created
 
 
-def update_unit(conn, unit_id: str, unit: schemas.UnitUpdate):
+UNITS_BULK_CHUNK_SIZE = int(os.getenv("UNITS_BULK_CHUNK_SIZE", "500"))
+UNITS_UPSERT_KEY = "project_id,unit_identifier"
+# Errores de datos (fila inválida, duplicada...): vale la pena separar el chunk.
+# Con 5xx o timeouts Supabase está caído y reintentar fila por fila solo multiplica la espera
+UNITS_BULK_ROW_ERRORS = {400, 409, 422}
+
+async def bulk_create_units(conn, rows: List[dict], chunk_size: int = UNITS_BULK_CHUNK_SIZE,
+                            upsert: bool = False):
+    """
+    Valida cada fila con UnitCreate y envía las válidas a PostgREST en arreglos
+    de `chunk_size`. Si un chunk falla por un error de datos (4xx) se reintenta
+    fila por fila para reportar solo las filas con error; con cualquier otro
+    error todo el chunk se marca fallido. `upsert` usa (project_id, unit_identifier).
+    """
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            unit = schemas.UnitCreate.model_validate(row)
+            valid.append((index, unit.model_dump(mode="json")))
+        except ValidationError as e:
+            errors.append({"row": index, "error": e.errors(include_url=False, include_context=False)})
+
+    on_conflict = UNITS_UPSERT_KEY if upsert else None
+    inserted = 0
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start: start + chunk_size]
+        try:
+            created = await conn.insert_many("units", [payload for _, payload in chunk], on_conflict)
+            inserted += len(created) if isinstance(created, list) else len(chunk)
+        except HTTPException as e:
+            pending = chunk if e.status_code in UNITS_BULK_ROW_ERRORS else []
+            if not pending:
+                errors.extend({"row": index, "error": e.detail} for index, _ in chunk)
+            for position, (index, payload) in enumerate(pending):
+                try:
+                    await conn.insert_many("units", [payload], on_conflict)
+                    inserted += 1
+                except HTTPException as row_error:
+                    errors.append({"row": index, "error": row_error.detail})
+                    if row_error.status_code not in UNITS_BULK_ROW_ERRORS:
+                        errors.extend({"row": i, "error": row_error.detail} for i, _ in pending[position + 1:])
+                        break
+
+    if inserted:
+        cache.invalidate("units")
+    errors.sort(key=lambda e: e["row"])
+    return {"received": len(rows), "inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+async def update_unit(conn, unit_id: str, unit: schemas.UnitUpdate):
     unit_id = _validate_uuid_str(unit_id)
     payload = unit.model_dump(exclude_unset=True)
     if not payload:
-        return get_unit(conn, unit_id)
+        return await get_unit(conn, unit_id)
 
-    updated = conn.update("units", {"id": unit_id}, payload)
+    updated = await conn.update("units", {"id": unit_id}, payload)
+    cache.invalidate("units")
     return updated[0] if isinstance(updated, list) and updated else updated
 
 
-def delete_unit(conn, unit_id: str):
+async def delete_unit(conn, unit_id: str):
     unit_id = _validate_uuid_str(unit_id)
-    res = conn.delete("units", {"id": unit_id})
+    res = await conn.delete("units", {"id": unit_id})
+    cache.invalidate("units")
     return res
 
 
@@ -1,10 +1,20 @@
 # database.py
+import asyncio
 import os
+import threading
+from contextlib import contextmanager
+import time
 from dotenv import load_dotenv
+import anyio.to_thread
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 from fastapi import HTTPException
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
+import metrics
+import querylog
 
 # Cargar .env
 load_dotenv()
@@ -15,20 +25,406 @@ load_dotenv()
 
 DB1_URL = os.getenv("DB1_URL")
 
+# Tamaño del pool y tiempos (configurables por .env)
+DB1_POOL_MIN = int(os.getenv("DB1_POOL_MIN", "1"))
+DB1_POOL_MAX = int(os.getenv("DB1_POOL_MAX", "10"))
+DB1_POOL_TIMEOUT = float(os.getenv("DB1_POOL_TIMEOUT", "10"))      # seg. esperando conexión libre
+DB1_POOL_PING_AFTER = float(os.getenv("DB1_POOL_PING_AFTER", "30"))  # seg. inactiva antes de validar
+
+class TimedCursor(RealDictCursor):
+    """
+    RealDictCursor instrumentado: latencia de cada sentencia en /metrics y
+    paso por el log de consultas lentas (querylog).
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        with metrics.track_backend("db1", *metrics.sql_labels(query)):
+            result = super().execute(query, vars)
+        querylog.record(self, query, vars, time.perf_counter() - start)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        with metrics.track_backend("db1", *metrics.sql_labels(query)):
+            result = super().executemany(query, vars_list)
+        querylog.record(self, query, None, time.perf_counter() - start)
+        return result
+
+
+class DB1Connection(extensions.connection):
+    """
+    Conexión de BD1 cuyos cursores son TimedCursor. crud pide
+    cursor_factory=RealDictCursor explícitamente; se sustituye por la subclase.
+    """
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory")
+        if factory is None or factory is RealDictCursor:
+            kwargs["cursor_factory"] = TimedCursor
+        return super().cursor(*args, **kwargs)
+
+
 def _connect_postgres(url: str):
     if not url:
         raise HTTPException(status_code=500, detail="DB1_URL no está configurado")
     try:
-        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+        return psycopg2.connect(url, connection_factory=DB1Connection, cursor_factory=RealDictCursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error conectando a BD1: {e}")
 
+
+class DB1Pool:
+    """
+    Pool acotado de conexiones a BD1.
+      - getconn() espera hasta `timeout` segundos si todas están ocupadas (503 si no hay).
+      - Al prestar: valida la conexión (SELECT 1) si estuvo inactiva más de `ping_after` seg.
+      - Al devolver: rollback de cualquier transacción abierta; si está rota se descarta.
+      - stats(): gauges de conexiones en uso y tiempos de espera.
+    """
+
+    def __init__(self, url: str, minconn: int, maxconn: int, timeout: float, ping_after: float):
+        # Lista propia de conexiones libres (LIFO). psycopg2.pool cierra las que
+        # se devuelven por encima de minconn; aquí se conservan hasta maxconn.
+        self._url = url
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        return psycopg2.connect(self._url, connection_factory=DB1Connection, cursor_factory=RealDictCursor)
+
+    def _take(self):
+        # El semáforo acota las prestadas, así abiertas (prestadas + libres) <= maxconn
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last = self._last_used.get(id(conn))
+        if last is not None and time.monotonic() - last < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.discarded += 1
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise HTTPException(status_code=503, detail="BD1 ocupada: no hay conexiones libres en el pool")
+        waited = time.monotonic() - start
+
+        try:
+            # Una conexión muerta se descarta y se abre otra en su lugar
+            for _ in range(self.maxconn + 1):
+                conn = self._take()
+                if self._is_healthy(conn):
+                    break
+                self._discard(conn)
+            else:
+                raise HTTPException(status_code=500, detail="Error conectando a BD1: conexiones del pool inválidas")
+        except HTTPException:
+            self._slots.release()
+            raise
+        except Exception as e:
+            self._slots.release()
+            raise HTTPException(status_code=500, detail=f"Error conectando a BD1: {e}")
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_last = waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        try:
+            if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._discard(conn)
+                    return
+            self._last_used[id(conn)] = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._last_used.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "wait_seconds_last": round(self.wait_last, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_seconds_avg": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+_db1_pool = None
+_db1_pool_lock = threading.Lock()
+
+def init_db1_pool():
+    """Crea el pool de BD1 (se llama al arrancar la app; los scripts lo crean al primer uso)."""
+    global _db1_pool
+    if not DB1_URL:
+        raise HTTPException(status_code=500, detail="DB1_URL no está configurado")
+    with _db1_pool_lock:
+        if _db1_pool is None:
+            try:
+                _db1_pool = DB1Pool(DB1_URL, DB1_POOL_MIN, DB1_POOL_MAX, DB1_POOL_TIMEOUT, DB1_POOL_PING_AFTER)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error conectando a BD1: {e}")
+    return _db1_pool
+
+def close_db1_pool():
+    global _db1_pool
+    with _db1_pool_lock:
+        if _db1_pool is not None:
+            _db1_pool.close()
+            _db1_pool = None
+
+def get_db1_pool_stats() -> dict:
+    if _db1_pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **_db1_pool.stats()}
+
+@contextmanager
+def db1_connection():
+    """Conexión prestada del pool fuera de Depends (tareas de fondo, scripts)."""
+    pool = _db1_pool or init_db1_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+def run_schema_setup(statements):
+    """
+    Ejecuta DDL idempotente (CREATE ... IF NOT EXISTS) de tablas/índices auxiliares.
+    Cada sentencia va en su propia transacción: si una falla (p. ej. permisos
+    para CREATE EXTENSION) se avisa y se sigue con las demás.
+    """
+    with db1_connection() as conn:
+        for statement in statements:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(statement)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Advertencia: esquema auxiliar BD1 ({' '.join(statement.split())[:60]}...): {e}")
+
 def get_db1():
-    conn = _connect_postgres(DB1_URL)
+    pool = _db1_pool or init_db1_pool()
+    conn = pool.getconn()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.putconn(conn)
+
+
+# =====================================================
+#   LECTURAS COALESCIDAS (single-flight + stale-while-revalidate)
+#   GETs idénticos concurrentes a Supabase comparten una sola petición
+#   y su resultado. Los resultados compartidos son de solo lectura.
+# =====================================================
+
+SUPABASE_COALESCE = os.getenv("SUPABASE_COALESCE", "1") == "1"
+# 0 = sin ventana: solo se comparten las peticiones en vuelo. Con N > 0 un
+# resultado se sirve hasta N seg.; pasada la mitad se refresca en segundo plano.
+SUPABASE_SWR_SECONDS = float(os.getenv("SUPABASE_SWR_SECONDS", "0"))
+SUPABASE_SWR_MAX_ENTRIES = int(os.getenv("SUPABASE_SWR_MAX_ENTRIES", "256"))
+
+_MISSING = object()
+_reads_lock = threading.Lock()
+_inflight_async = {}
+_inflight_sync = {}
+_recent_reads = {}       # clave -> (momento, resultado)
+_read_generations = {}   # (backend, tabla) -> generación; sube con cada escritura
+
+
+class _SyncCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _read_key(backend: str, table: str, params: dict = None, *extra) -> tuple:
+    items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return (backend, table, items) + extra
+
+
+def _read_generation(key) -> int:
+    return _read_generations.get(key[:2], 0)
+
+
+def _recent_read(key):
+    """(resultado, hay_que_refrescar) o (_MISSING, False)."""
+    if SUPABASE_SWR_SECONDS <= 0:
+        return _MISSING, False
+    with _reads_lock:
+        entry = _recent_reads.get(key)
+        if entry is None:
+            return _MISSING, False
+        age = time.monotonic() - entry[0]
+        if age > SUPABASE_SWR_SECONDS:
+            del _recent_reads[key]
+            return _MISSING, False
+    return entry[1], age > SUPABASE_SWR_SECONDS / 2
+
+
+def _remember_read(key, result, generation: int):
+    if SUPABASE_SWR_SECONDS <= 0:
+        return
+    with _reads_lock:
+        # Una escritura durante la petición invalida su resultado
+        if _read_generation(key) != generation:
+            return
+        if key not in _recent_reads and len(_recent_reads) >= SUPABASE_SWR_MAX_ENTRIES:
+            oldest = min(_recent_reads, key=lambda k: _recent_reads[k][0])
+            del _recent_reads[oldest]
+        _recent_reads[key] = (time.monotonic(), result)
+
+
+def invalidate_reads(backend: str, table: str):
+    """Tras escribir en `table`: nadie se une a lecturas previas ni recibe resultados viejos."""
+    with _reads_lock:
+        _read_generations[(backend, table)] = _read_generations.get((backend, table), 0) + 1
+        for pending in (_recent_reads, _inflight_async, _inflight_sync):
+            for key in [k for k in pending if k[:2] == (backend, table)]:
+                del pending[key]
+
+
+def _start_async_read(key, fetch) -> asyncio.Task:
+    generation = _read_generation(key)
+    task = asyncio.ensure_future(fetch())
+    _inflight_async[key] = task
+
+    def _done(t):
+        with _reads_lock:
+            if _inflight_async.get(key) is t:
+                del _inflight_async[key]
+        if not t.cancelled() and t.exception() is None:
+            _remember_read(key, t.result(), generation)
+
+    task.add_done_callback(_done)
+    return task
+
+
+async def _coalesced_async(key, fetch):
+    if not SUPABASE_COALESCE:
+        return await fetch()
+    backend, table = key[:2]
+    result, revalidate = _recent_read(key)
+    task = _inflight_async.get(key)
+    if task is not None and task.get_loop() is not asyncio.get_running_loop():
+        task = None
+    if result is not _MISSING:
+        if revalidate and task is None:
+            _start_async_read(key, fetch)
+        metrics.BACKEND_COALESCED.inc(backend=backend, table=table, kind="stale")
+        return result
+    if task is None:
+        task = _start_async_read(key, fetch)
+    else:
+        metrics.BACKEND_COALESCED.inc(backend=backend, table=table, kind="inflight")
+    # shield: si el cliente que la inició se desconecta, la petición sigue para los demás
+    return await asyncio.shield(task)
+
+
+def _lead_sync_read(key, call: _SyncCall, fetch, generation: int):
+    try:
+        call.result = fetch()
+        _remember_read(key, call.result, generation)
+    except Exception as e:
+        call.error = e
+    finally:
+        with _reads_lock:
+            if _inflight_sync.get(key) is call:
+                del _inflight_sync[key]
+        call.event.set()
+
+
+def _coalesced_sync(key, fetch):
+    if not SUPABASE_COALESCE:
+        return fetch()
+    backend, table = key[:2]
+    result, revalidate = _recent_read(key)
+    with _reads_lock:
+        call = _inflight_sync.get(key)
+        leader = call is None and (result is _MISSING or revalidate)
+        if leader:
+            call = _inflight_sync[key] = _SyncCall()
+            generation = _read_generation(key)
+    if result is not _MISSING:
+        if leader:
+            threading.Thread(target=_lead_sync_read, args=(key, call, fetch, generation), daemon=True).start()
+        metrics.BACKEND_COALESCED.inc(backend=backend, table=table, kind="stale")
+        return result
+    if leader:
+        _lead_sync_read(key, call, fetch, generation)
+    else:
+        metrics.BACKEND_COALESCED.inc(backend=backend, table=table, kind="inflight")
+        call.event.wait()
+    if call.error is not None:
+        raise call.error
+    return call.result
 
 
 # =====================================================
@@ -40,16 +436,50 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_APIKEY = os.getenv("SUPABASE_APIKEY")
 SUPABASE_BEARER = os.getenv("SUPABASE_BEARER")
 
-def supabase_get(table: str, params: dict = None):
-    url = f"{SUPABASE_URL}/rest/v1/{table}"
-    headers = {
+# Sesiones HTTP persistentes (keep-alive) compartidas por proyecto Supabase
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "30"))
+SUPABASE_TIMEOUT = (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)
+
+def _build_session(headers: dict) -> requests.Session:
+    """Session con pool de conexiones reutilizables y headers fijos del proyecto."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SUPABASE_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+def _request(session: requests.Session, backend: str, method: str, table: str, url: str, **kwargs):
+    """Petición a PostgREST con latencia y tamaño de respuesta registrados en /metrics."""
+    try:
+        with metrics.track_backend(backend, table, method):
+            response = session.request(method, url, timeout=SUPABASE_TIMEOUT, **kwargs)
+    finally:
+        if method != "GET":
+            invalidate_reads(backend, table)
+    metrics.observe_payload(backend, table, method, len(response.content))
+    return response
+
+def _build_headers_for_supabase():
+    return {
         "apikey": SUPABASE_APIKEY,
         "Authorization": f"Bearer {SUPABASE_BEARER}",
         "Content-Type": "application/json",
         "Prefer": "return=representation"
     }
+
+_supabase_session = _build_session(_build_headers_for_supabase())
+
+def supabase_get(table: str, params: dict = None):
+    return _coalesced_sync(_read_key("supabase", table, params), lambda: _supabase_get(table, params))
+
+def _supabase_get(table: str, params: dict = None):
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = _request(_supabase_session, "supabase", "GET", table, url, params=params)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
@@ -83,11 +513,19 @@ def _build_headers_for_supabase2():
         "Prefer": "return=representation"
     }
 
+_supabase2_session = _build_session(_build_headers_for_supabase2())
+
+def close_supabase_sessions():
+    _supabase_session.close()
+    _supabase2_session.close()
+
 def supabase2_get(table: str, params: dict = None):
+    return _coalesced_sync(_read_key("supabase2", table, params), lambda: _supabase2_get(table, params))
+
+def _supabase2_get(table: str, params: dict = None):
     url = f"{SUPABASE2_URL}/rest/v1/{table}"
-    headers = _build_headers_for_supabase2()
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = _request(_supabase2_session, "supabase2", "GET", table, url, params=params)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
@@ -96,9 +534,8 @@ def supabase2_get(table: str, params: dict = None):
 
 def supabase2_post(table: str, data: dict):
     url = f"{SUPABASE2_URL}/rest/v1/{table}"
-    headers = _build_headers_for_supabase2()
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = _request(_supabase2_session, "supabase2", "POST", table, url, json=data)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
@@ -109,9 +546,8 @@ def supabase2_patch(table: str, filters: dict, data: dict):
     url = f"{SUPABASE2_URL}/rest/v1/{table}"
     # convierte filtros {'id': 'uuid'} -> params {'id': 'eq.uuid'}
     params = {k: f"eq.{v}" for k, v in (filters or {}).items()}
-    headers = _build_headers_for_supabase2()
     try:
-        response = requests.patch(url, headers=headers, params=params, json=data)
+        response = _request(_supabase2_session, "supabase2", "PATCH", table, url, params=params, json=data)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
@@ -121,9 +557,8 @@ def supabase2_patch(table: str, filters: dict, data: dict):
 def supabase2_delete(table: str, filters: dict):
     url = f"{SUPABASE2_URL}/rest/v1/{table}"
     params = {k: f"eq.{v}" for k, v in (filters or {}).items()}
-    headers = _build_headers_for_supabase2()
     try:
-        response = requests.delete(url, headers=headers, params=params)
+        response = _request(_supabase2_session, "supabase2", "DELETE", table, url, params=params)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         # Supabase puede devolver 204 o devolver representación dependiendo de Prefer
@@ -133,6 +568,21 @@ def supabase2_delete(table: str, filters: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error Supabase2 DELETE: {e}")
 
+class Supabase2Client:
+    """Cliente síncrono de Supabase2 (scripts y código bloqueante)."""
+
+    def select(self, table: str, params: dict = None):
+        return supabase2_get(table, params)
+
+    def insert(self, table: str, data: dict):
+        return supabase2_post(table, data)
+
+    def update(self, table: str, filters: dict, data: dict):
+        return supabase2_patch(table, filters, data)
+
+    def delete(self, table: str, filters: dict):
+        return supabase2_delete(table, filters)
+
 def get_supabase2():
     """
     Devuelve un cliente con métodos:
@@ -142,22 +592,254 @@ def get_supabase2():
       - delete(table, filters)      -> borrado
     Uso: conn = Depends(get_supabase2); conn.select("units", {"project_id":"eq.<id>"})
     """
-    class Supabase2Client:
-        def select(self, table: str, params: dict = None):
-            return supabase2_get(table, params)
-
-        def insert(self, table: str, data: dict):
-            return supabase2_post(table, data)
-
-        def update(self, table: str, filters: dict, data: dict):
-            return supabase2_patch(table, filters, data)
-
-        def delete(self, table: str, filters: dict):
-            return supabase2_delete(table, filters)
-
     return Supabase2Client()
 
 # Alias estilo "BD3" para usar en Depends()
 def get_db3():
     """Para endpoints que quieran la BD3 (Supabase IMEXICO) como cliente completo."""
     return get_supabase2()
+
+
+# =====================================================
+#   CLIENTES ASÍNCRONOS (httpx) PARA LOS ROUTERS
+#   Las peticiones en vuelo esperan en el event loop
+#   en vez de ocupar un hilo del threadpool.
+# =====================================================
+
+SUPABASE_ASYNC_POOL_SIZE = int(os.getenv("SUPABASE_ASYNC_POOL_SIZE", "100"))
+
+_async_clients = {}
+
+def _build_async_client(headers: dict) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers={k: v for k, v in headers.items() if v is not None},
+        timeout=httpx.Timeout(SUPABASE_READ_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_ASYNC_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_ASYNC_POOL_SIZE
+        )
+    )
+
+def _get_async_client(name: str) -> httpx.AsyncClient:
+    client = _async_clients.get(name)
+    if client is None or client.is_closed:
+        headers = _build_headers_for_supabase() if name == "supabase" else _build_headers_for_supabase2()
+        client = _async_clients[name] = _build_async_client(headers)
+    return client
+
+def init_supabase_async_clients():
+    """Se llama al arrancar la app para crear los clientes dentro del event loop."""
+    _get_async_client("supabase")
+    _get_async_client("supabase2")
+
+async def close_supabase_async_clients():
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+
+async def _request_async(name: str, method: str, table: str, url: str, **kwargs):
+    try:
+        with metrics.track_backend(name, table, method):
+            response = await _get_async_client(name).request(method, url, **kwargs)
+    finally:
+        if method != "GET":
+            invalidate_reads(name, table)
+    metrics.observe_payload(name, table, method, len(response.content))
+    return response
+
+async def supabase_get_async(table: str, params: dict = None):
+    return await _coalesced_async(_read_key("supabase", table, params),
+                                  lambda: _supabase_get_async(table, params))
+
+async def _supabase_get_async(table: str, params: dict = None):
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    try:
+        response = await _request_async("supabase", "GET", table, url, params=params)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error consultando Supabase: {e}")
+
+async def supabase2_get_async(table: str, params: dict = None):
+    return await _coalesced_async(_read_key("supabase2", table, params),
+                                  lambda: _supabase2_get_async(table, params))
+
+async def _supabase2_get_async(table: str, params: dict = None):
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    try:
+        response = await _request_async("supabase2", "GET", table, url, params=params)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 GET: {e}")
+
+def _parse_content_range_total(value: str):
+    # PostgREST: "0-24/3573", "*/0" o "0-24/*" (sin conteo)
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+async def supabase2_get_page_async(table: str, params: dict = None, offset: int = 0,
+                                   limit: int = None, count: str = "exact"):
+    """
+    GET paginado en el servidor (limit/offset de PostgREST).
+    Devuelve (filas, total); total sale de Content-Range si se pide `count`
+    ("exact", "planned" o "estimated"), si no es None.
+    """
+    return await _coalesced_async(_read_key("supabase2", table, params, offset, limit, count),
+                                  lambda: _supabase2_get_page_async(table, params, offset, limit, count))
+
+async def _supabase2_get_page_async(table: str, params: dict = None, offset: int = 0,
+                                    limit: int = None, count: str = "exact"):
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    params = dict(params or {})
+    if offset:
+        params["offset"] = offset
+    if limit is not None:
+        params["limit"] = limit
+    headers = {"Prefer": f"count={count}"} if count else None
+    try:
+        response = await _request_async("supabase2", "GET", table, url, params=params, headers=headers)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json(), _parse_content_range_total(response.headers.get("Content-Range"))
+    except HTTPException:
+        # Status de PostgREST intacto (p. ej. 400 PGRST123 sin agregados)
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 GET: {e}")
+
+async def supabase2_post_async(table: str, data: dict):
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    try:
+        response = await _request_async("supabase2", "POST", table, url, json=data)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 POST: {e}")
+
+async def supabase2_post_many_async(table: str, rows: list, on_conflict: str = None):
+    """Insert de un arreglo en una sola petición; con `on_conflict` hace upsert (merge)."""
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    params, headers = None, None
+    if on_conflict:
+        params = {"on_conflict": on_conflict}
+        headers = {"Prefer": "return=representation,resolution=merge-duplicates"}
+    try:
+        response = await _request_async("supabase2", "POST", table, url, params=params, json=rows, headers=headers)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    except HTTPException:
+        # Se conserva el status de PostgREST: bulk_create_units distingue 4xx de caídas
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 POST: {e}")
+
+async def supabase2_patch_async(table: str, filters: dict, data: dict):
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    params = {k: f"eq.{v}" for k, v in (filters or {}).items()}
+    try:
+        response = await _request_async("supabase2", "PATCH", table, url, params=params, json=data)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 PATCH: {e}")
+
+async def supabase2_delete_async(table: str, filters: dict):
+    url = f"{SUPABASE2_URL}/rest/v1/{table}"
+    params = {k: f"eq.{v}" for k, v in (filters or {}).items()}
+    try:
+        response = await _request_async("supabase2", "DELETE", table, url, params=params)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        if response.status_code in (200, 204):
+            return {"deleted": True}
+        return response.json()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error Supabase2 DELETE: {e}")
+
+class AsyncSupabase2Client:
+    """Misma interfaz que Supabase2Client pero con métodos `async`."""
+
+    async def select(self, table: str, params: dict = None):
+        return await supabase2_get_async(table, params)
+
+    async def select_page(self, table: str, params: dict = None, offset: int = 0,
+                          limit: int = None, count: str = "exact"):
+        return await supabase2_get_page_async(table, params, offset, limit, count)
+
+    async def insert(self, table: str, data: dict):
+        return await supabase2_post_async(table, data)
+
+    async def insert_many(self, table: str, rows: list, on_conflict: str = None):
+        return await supabase2_post_many_async(table, rows, on_conflict)
+
+    async def update(self, table: str, filters: dict, data: dict):
+        return await supabase2_patch_async(table, filters, data)
+
+    async def delete(self, table: str, filters: dict):
+        return await supabase2_delete_async(table, filters)
+
+def get_supabase_async():
+    """Dependency async: `rows = await conn("tabla", params)`."""
+    async def _client(table: str, params: dict = None):
+        return await supabase_get_async(table, params)
+    return _client
+
+def get_db3_async():
+    """Dependency async para BD3: `await conn.select("units", {...})`."""
+    return AsyncSupabase2Client()
+
+
+# =====================================================
+#   FAN-OUT EN PARALELO DENTRO DE UNA PETICIÓN
+#   Partes independientes (consultas de BD1 en conexiones
+#   distintas del pool + llamadas a Supabase) a la vez:
+#   la latencia es la de la parte más lenta, no la suma.
+# =====================================================
+
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "15"))
+
+async def run_db1(fn, *args, **kwargs):
+    """
+    Ejecuta `fn(conn, *args, **kwargs)` en un hilo con su propia conexión del
+    pool. Cada parte ve su propio snapshot: no usar para lecturas que deban ser
+    consistentes entre sí.
+    """
+    def _call():
+        with db1_connection() as conn:
+            return fn(conn, *args, **kwargs)
+    # Si vence el plazo el hilo termina solo y devuelve la conexión al pool
+    return await anyio.to_thread.run_sync(_call, abandon_on_cancel=True)
+
+async def fan_out(*parts, timeout: float = None):
+    """
+    Espera varias corutinas a la vez y devuelve sus resultados en orden.
+      - Si una falla se cancelan las demás y se propaga su error.
+      - Si no terminan en `timeout` seg. (FANOUT_TIMEOUT por defecto) -> 504.
+    Uso: proyectos, unidades = await fan_out(run_db1(crud.get_projects), conn.select("units"))
+    """
+    tasks = [asyncio.ensure_future(part) for part in parts]
+    timeout = FANOUT_TIMEOUT if timeout is None else timeout
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_EXCEPTION)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    # Se leen todas las excepciones (evita "exception was never retrieved")
+    errors = [task.exception() for task in tasks if task in done and not task.cancelled()]
+    for error in errors:
+        if error is not None:
+            raise error
+    if pending:
+        raise HTTPException(status_code=504, detail=f"Tiempo de espera agotado ({timeout:g} s) consultando los backends")
+    return [task.result() for task in tasks]
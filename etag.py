@@ -0,0 +1,112 @@
+# etag.py
+# ETag / If-None-Match para las respuestas JSON de los GET de /api.
+#  - El ETag es un hash del cuerpo ya serializado (respeta response_model).
+#  - Se recuerda por URL en cache.py (junto con la ruta que la atendió), en el
+#    namespace de la entidad: si el cliente manda ese mismo ETag y ninguna
+#    escritura invalidó el namespace (ni venció su TTL), se responde 304 sin
+#    llamar al endpoint, es decir, sin consultar BD1/Supabase ni serializar.
+#  - Respuestas no JSON (p. ej. /units/export en streaming) pasan intactas.
+
+import hashlib
+from starlette.datastructures import Headers, MutableHeaders
+import cache
+
+# Prefijo de ruta -> namespace de cache.py que invalida crud.py al escribir.
+# None: la respuesta depende de varias entidades; hay ETag pero sin atajo.
+ETAG_NAMESPACES = {
+    "/api/projects/summary": None,
+    "/api/zones": "zones",
+    "/api/projects": "projects",
+    "/api/users": "users",
+    "/api/units": "units",
+}
+
+
+def _namespace_for(path: str):
+    for prefix, namespace in ETAG_NAMESPACES.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            return namespace
+    return None
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((t[2:] if t.startswith("W/") else t) == bare for t in tags)
+
+
+async def _send_not_modified(send, etag: str):
+    await send({
+        "type": "http.response.start",
+        "status": 304,
+        "headers": [(b"etag", etag.encode()), (b"cache-control", b"no-cache")],
+    })
+    await send({"type": "http.response.body", "body": b""})
+
+
+class ETagMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        namespace = _namespace_for(scope["path"])
+        key = ("etag", scope["path"], scope.get("query_string", b"").decode())
+
+        # Versión conocida y vigente: ni siquiera se ejecuta el endpoint
+        if namespace and if_none_match:
+            stamp = cache.lookup(namespace, key)
+            if stamp and _matches(if_none_match, stamp[0]):
+                # El router no corre: se deja la ruta que resolvió la primera vez
+                # para que /metrics cuente el 304 en su ruta y no como "unmatched"
+                if stamp[1] is not None:
+                    scope["route"] = stamp[1]
+                await _send_not_modified(send, stamp[0])
+                return
+
+        generation = cache.generation(namespace) if namespace else None
+        start = None
+        passthrough = False
+        body = []
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if message["status"] != 200 or not content_type.startswith("application/json"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            content = b"".join(body)
+            etag = 'W/"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+            if namespace:
+                cache.store(namespace, key, (etag, scope.get("route")), generation)
+
+            if if_none_match and _matches(if_none_match, etag):
+                await _send_not_modified(send, etag)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["ETag"] = etag
+            headers["Cache-Control"] = "no-cache"
+            await send(start)
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_wrapper)
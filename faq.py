@@ -0,0 +1,220 @@
+# faq.py
+# Tokenizador y conteo de términos para las preguntas frecuentes de WhatsApp.
+# Procesa un mensaje a la vez: la memoria crece con el vocabulario, no con el texto.
+
+import os
+import re
+from collections import Counter
+from datetime import date
+from typing import Iterable, Optional
+from fastapi.concurrency import run_in_threadpool
+from psycopg2.extras import execute_values
+from database import run_db1
+
+TOKEN_PATTERN = re.compile(r"[a-zA-Z0-9áéíóúñü]+")
+
+DEFAULT_STOPWORDS = {
+    "hola","buenas","gracias","por","favor","ok","si","de","la","el","y","a","en",
+    "que","se","lo","me","es","un","una","para","tu","mi","los","las","del"
+}
+
+# Configuración (.env):
+#   FAQ_STOPWORDS_FILE  -> archivo con una palabra por línea (reemplaza la lista por defecto)
+#   FAQ_STOPWORDS       -> palabras extra separadas por coma
+#   FAQ_MIN_WORD_LENGTH -> longitud mínima de término (por defecto 4)
+FAQ_MIN_WORD_LENGTH = int(os.getenv("FAQ_MIN_WORD_LENGTH", "4"))
+
+def load_stopwords() -> frozenset:
+    words = set(DEFAULT_STOPWORDS)
+    path = os.getenv("FAQ_STOPWORDS_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            words = {line.strip().lower() for line in f if line.strip() and not line.startswith("#")}
+    extra = os.getenv("FAQ_STOPWORDS")
+    if extra:
+        words.update(w.strip().lower() for w in extra.split(",") if w.strip())
+    return frozenset(words)
+
+# Se carga una sola vez al importar el módulo
+STOPWORDS = load_stopwords()
+
+
+def iter_terms(text: str, stopwords: frozenset = STOPWORDS, min_length: int = FAQ_MIN_WORD_LENGTH):
+    """Genera los términos de un mensaje sin construir listas intermedias."""
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if len(word) >= min_length and word not in stopwords:
+            yield word
+
+
+def count_terms(texts: Iterable[str], counter: Optional[Counter] = None) -> Counter:
+    """Alimenta un Counter mensaje por mensaje."""
+    counter = Counter() if counter is None else counter
+    for text in texts:
+        if text:
+            counter.update(iter_terms(text))
+    return counter
+
+
+# =====================================================
+#   LECTURA PAGINADA DEL HISTORIAL (SUPABASE)
+#   PostgREST nunca devuelve más de max-rows filas por GET (Supabase: 1000):
+#   se recorre por keyset (fecha, id) hasta una página corta.
+# =====================================================
+
+SUPABASE_MAX_ROWS = int(os.getenv("SUPABASE_MAX_ROWS", "1000"))
+
+# Filas sin fecha al final (NULLS LAST); entre ellas se ordena solo por id
+MESSAGES_PAGE_ORDER = "fecha.asc.nullslast,id.asc"
+_MESSAGES_PAGE_KEYS = ("fecha", "id")
+
+
+def _messages_keyset_filter(last: dict) -> dict:
+    fecha, last_id = last.get("fecha"), last["id"]
+    if fecha is None:
+        # Ya en la cola de nulos: solo quedan nulos con id mayor
+        return {"and": f"(fecha.is.null,id.gt.{last_id})"}
+    return {"or": f'(fecha.gt."{fecha}",and(fecha.eq."{fecha}",id.gt.{last_id}),fecha.is.null)'}
+
+
+async def iter_message_pages(fetch, table: str, params: dict, page_size: int = SUPABASE_MAX_ROWS):
+    """
+    Recorre `table` en páginas de hasta `page_size` filas ordenadas por (fecha, id).
+    `fetch` es el cliente async de get_supabase_async; `params` no debe traer order/limit.
+    """
+    columns = params.get("select", "").split(",") if params.get("select") else []
+    select = ",".join(dict.fromkeys([c for c in columns if c] + list(_MESSAGES_PAGE_KEYS)))
+    params = {**params, "select": select, "order": MESSAGES_PAGE_ORDER, "limit": str(page_size)}
+    page_params = params
+    while True:
+        rows = await fetch(table, page_params)
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            break
+        page_params = {**params, **_messages_keyset_filter(rows[-1])}
+
+
+# =====================================================
+#   ÍNDICE INCREMENTAL DE TÉRMINOS POR DÍA (BD1)
+#   Cada refresh solo tokeniza filas con fecha >= watermark
+#   (el último día se recalcula porque puede seguir creciendo).
+# =====================================================
+
+FAQ_INDEX_TTL = float(os.getenv("FAQ_INDEX_TTL", "300"))  # seg. antes de refrescar solo
+
+SCHEMA_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS faq_term_daily (
+        fecha DATE NOT NULL,
+        term TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        PRIMARY KEY (fecha, term)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS faq_index_state (
+        id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        watermark DATE,
+        refreshed_at TIMESTAMPTZ
+    )
+    """,
+]
+
+
+def _bucket_day(fecha) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(fecha)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def get_index_state(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT watermark, refreshed_at,
+                   refreshed_at IS NOT NULL AND refreshed_at > now() - make_interval(secs => %s) AS fresh
+            FROM faq_index_state WHERE id = 1
+        """, (FAQ_INDEX_TTL,))
+        row = cur.fetchone()
+    return row or {"watermark": None, "refreshed_at": None, "fresh": False}
+
+
+def bucket_rows(rows, buckets: dict) -> dict:
+    """Suma los términos de `rows` a `buckets` ({día: Counter})."""
+    for row in rows:
+        day = _bucket_day(row.get("fecha"))
+        contenido = row.get("historial_conversacion")
+        if day is None or not contenido:
+            continue
+        buckets.setdefault(day, Counter()).update(iter_terms(contenido))
+    return buckets
+
+
+def apply_buckets(conn, buckets: dict, rows_indexed: int, watermark: Optional[date]) -> dict:
+    """Reemplaza los buckets desde `watermark` en una sola transacción."""
+    values = [(day, term, total) for day, counter in buckets.items() for term, total in counter.items()]
+    new_watermark = max(buckets, default=watermark)
+
+    try:
+        with conn.cursor() as cur:
+            # Serializa refrescos concurrentes
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('faq_term_daily'))")
+            if watermark is None:
+                cur.execute("DELETE FROM faq_term_daily")
+            else:
+                cur.execute("DELETE FROM faq_term_daily WHERE fecha >= %s", (watermark,))
+            if values:
+                execute_values(cur, "INSERT INTO faq_term_daily (fecha, term, total) VALUES %s", values, page_size=1000)
+            cur.execute("""
+                INSERT INTO faq_index_state (id, watermark, refreshed_at) VALUES (1, %s, now())
+                ON CONFLICT (id) DO UPDATE SET watermark = EXCLUDED.watermark, refreshed_at = EXCLUDED.refreshed_at
+            """, (new_watermark,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"watermark": new_watermark, "rows_indexed": rows_indexed, "days_updated": len(buckets)}
+
+
+async def refresh_index(fetch, table: str, force: bool = False) -> dict:
+    """
+    Trae de Supabase solo las filas desde el watermark y actualiza el índice.
+    `fetch` es el cliente async de get_supabase_async. Cada paso de BD1 va en
+    su propia conexión del pool (run_db1): ninguna queda prestada durante la
+    descarga y, si fan_out abandona la parte por plazo, el hilo la devuelve al terminar.
+    """
+    state = await run_db1(get_index_state)
+    if state["fresh"] and not force:
+        return {"watermark": state["watermark"], "rows_indexed": 0, "days_updated": 0}
+
+    params = {"select": "fecha,historial_conversacion"}
+    if state["watermark"]:
+        params["fecha"] = f"gte.{state['watermark'].isoformat()}"
+    # Se recorren todas las páginas antes de escribir: el watermark solo avanza
+    # si la lectura llegó al final (una GET sola se corta en max-rows)
+    buckets, rows_indexed = {}, 0
+    async for rows in iter_message_pages(fetch, table, params):
+        await run_in_threadpool(bucket_rows, rows, buckets)
+        rows_indexed += len(rows)
+    return await run_db1(apply_buckets, buckets, rows_indexed, state["watermark"])
+
+
+def top_terms(conn, top: int = 15, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """Top-N sumando buckets diarios; no vuelve a leer texto."""
+    query = "SELECT term AS palabra, SUM(total)::int AS total FROM faq_term_daily"
+    conditions, params = [], []
+    if date_from:
+        conditions.append("fecha >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("fecha <= %s")
+        params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " GROUP BY term ORDER BY total DESC, term ASC LIMIT %s"
+    params.append(top)
+
+    with conn.cursor() as cur:
+        cur.execute(query, tuple(params))
+        return cur.fetchall()
@@ -1,15 +1,60 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from routers import projects, zones, users, dashboard, units
+import cache
+import crud
+import database
+import faq
+import metrics
+import querylog
+from etag import ETagMiddleware
+from metrics import MetricsMiddleware
+from responses import CompressionMiddleware, FastJSONResponse
 import uvicorn
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de BD1 compartido por todas las peticiones
+    try:
+        database.init_db1_pool()
+    except HTTPException as e:
+        print(f"Advertencia: no se pudo crear el pool de BD1 al arrancar ({e.detail}); se reintentará en la primera petición")
+    else:
+        # Tablas/índices auxiliares de la app
+        try:
+            database.run_schema_setup(crud.SCHEMA_DDL + faq.SCHEMA_DDL)
+        except Exception as e:
+            print(f"Advertencia: no se pudo preparar el esquema auxiliar de BD1 ({e})")
+    database.init_supabase_async_clients()
+    stats_task = asyncio.create_task(dashboard.dashboard_stats_refresher())
+    yield
+    stats_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await stats_task
+    database.close_db1_pool()
+    database.close_supabase_sessions()
+    await database.close_supabase_async_clients()
+
+
 app = FastAPI(
     title="Miki.ai API",
     description="La API para la plataforma de gestión de proyectos Miki.ai",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# ETag + 304 para los GET JSON de /api
+app.add_middleware(ETagMiddleware)
+# Compresión br/gzip (se agrega después: envuelve al ETag y comprime su salida)
+app.add_middleware(CompressionMiddleware)
+# Métricas por ruta (el más externo: mide también ETag y compresión)
+app.add_middleware(MetricsMiddleware)
+
 # Servir archivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -20,6 +65,36 @@ app.include_router(dashboard.router, prefix="/api")
 app.include_router(units.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 
+# Gauges del pool de BD1 (conexiones en uso, tiempos de espera)
+@app.get("/api/health/db1-pool")
+def db1_pool_stats():
+    return database.get_db1_pool_stats()
+
+# Hits/misses de la caché de zonas y proyectos
+@app.get("/api/health/cache")
+def cache_stats():
+    return cache.stats()
+
+# Sentencias de BD1 con más tiempo acumulado (log de consultas lentas)
+@app.get("/api/health/slow-queries")
+def slow_queries(limit: int = Query(20, ge=1, le=500),
+                 order_by: str = Query("total_ms", pattern="^(total_ms|mean_ms|max_ms|calls|slow_calls)$")):
+    return {
+        "slow_query_ms": querylog.DB1_SLOW_QUERY_MS,
+        "explain_sample_rate": querylog.DB1_EXPLAIN_SAMPLE_RATE,
+        "queries": querylog.top_queries(limit, order_by),
+    }
+
+@app.delete("/api/health/slow-queries")
+def reset_slow_queries():
+    querylog.reset()
+    return {"message": "Estadísticas de consultas reiniciadas"}
+
+# Métricas en formato Prometheus (peticiones, BD1, Supabase, serialización)
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Servir tu index.html desde la carpeta templates
 @app.get("/")
 def read_root():
@@ -0,0 +1,270 @@
+# metrics.py
+# Métricas en formato de texto de Prometheus (sin dependencias externas).
+#   - Peticiones HTTP: conteo, latencia, tamaño de respuesta y en vuelo, por ruta.
+#   - Llamadas a backends: BD1 (Postgres) y Supabase, por tabla y método.
+#   - Serialización JSON de las respuestas.
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from starlette.datastructures import MutableHeaders
+
+
+# =====================================================
+#   TIPOS DE MÉTRICA
+# =====================================================
+
+# Buckets en segundos (desde ~1 ms hasta 30 s) y en bytes (100 B hasta 10 MB)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [conteos por bucket..., suma, total]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _render_items(self, items):
+        for key, state in items:
+            for i, bound in enumerate(self.buckets):
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket{le} {state[i]}"
+            labels = _format_labels(self.labelnames, key)
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {state[-1]}"
+            yield f"{self.name}_sum{labels} {_format_value(float(state[-2]))}"
+            yield f"{self.name}_count{labels} {state[-1]}"
+
+
+# =====================================================
+#   REGISTRO
+# =====================================================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Peticiones HTTP atendidas.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Peticiones HTTP en curso.", ("method",))
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Bytes enviados en el cuerpo de la respuesta (ya comprimido).",
+    ("method", "route"), SIZE_BUCKETS)
+
+BACKEND_LATENCY = Histogram(
+    "backend_request_duration_seconds", "Latencia de las llamadas a BD1 y Supabase.",
+    ("backend", "table", "method"))
+BACKEND_ERRORS = Counter(
+    "backend_request_errors_total", "Llamadas a backends que terminaron en error.",
+    ("backend", "table", "method"))
+BACKEND_IN_FLIGHT = Gauge(
+    "backend_requests_in_flight", "Llamadas a backends en curso.", ("backend",))
+BACKEND_PAYLOAD_SIZE = Histogram(
+    "backend_response_size_bytes", "Bytes recibidos de Supabase por llamada.",
+    ("backend", "table", "method"), SIZE_BUCKETS)
+BACKEND_COALESCED = Counter(
+    "backend_coalesced_reads_total",
+    "Lecturas a Supabase servidas sin petición propia (en vuelo compartida o ventana SWR).",
+    ("backend", "table", "kind"))
+
+SERIALIZATION_LATENCY = Histogram(
+    "json_serialization_duration_seconds", "Tiempo serializando respuestas JSON.")
+
+UNIT_STATS_UNMATCHED = Counter(
+    "unit_stats_unmatched_projects_total",
+    "Proyectos del resumen cuyo id no es UUID: no se pueden unir con units de Supabase2.")
+
+REGISTRY = (
+    HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, HTTP_RESPONSE_SIZE,
+    BACKEND_LATENCY, BACKEND_ERRORS, BACKEND_IN_FLIGHT, BACKEND_PAYLOAD_SIZE, BACKEND_COALESCED,
+    SERIALIZATION_LATENCY, UNIT_STATS_UNMATCHED,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =====================================================
+#   BACKENDS
+# =====================================================
+
+@contextmanager
+def track_backend(backend: str, table: str, method: str):
+    """Mide una llamada a BD1/Supabase: `with metrics.track_backend("supabase2", "units", "GET"):`"""
+    BACKEND_IN_FLIGHT.inc(backend=backend)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        BACKEND_ERRORS.inc(backend=backend, table=table, method=method)
+        raise
+    finally:
+        BACKEND_LATENCY.observe(time.perf_counter() - start, backend=backend, table=table, method=method)
+        BACKEND_IN_FLIGHT.dec(backend=backend)
+
+
+def observe_payload(backend: str, table: str, method: str, size: int):
+    BACKEND_PAYLOAD_SIZE.observe(size, backend=backend, table=table, method=method)
+
+
+# Verbo y tabla principal de una sentencia SQL (etiquetas de cardinalidad acotada)
+_SQL_VERB = re.compile(r"^\s*(\w+)")
+_SQL_DML = re.compile(r"\b(INSERT|UPDATE|DELETE)\b", re.I)
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([A-Za-z_][\w.]*)", re.I)
+
+
+def sql_labels(query) -> tuple:
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    verb = _SQL_VERB.match(query)
+    verb = verb.group(1).upper() if verb else "OTHER"
+    if verb == "WITH":
+        # CTE: cuenta como la escritura que contiene, si la hay
+        dml = _SQL_DML.search(query)
+        verb = dml.group(1).upper() if dml else "SELECT"
+    table = _SQL_TABLE.search(query)
+    return (table.group(1).lower() if table else "-"), verb
+
+
+# =====================================================
+#   MIDDLEWARE ASGI
+# =====================================================
+
+def _route_label(scope) -> str:
+    # Plantilla de la ruta (/api/projects/{project_id}), nunca la URL concreta
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        # Mount de /static u otra app montada; sin ruta = 404
+        return scope.get("root_path") or "unmatched"
+    # Con include_router la plantilla no lleva el prefijo (/api): se toma de la
+    # URL, que tiene los mismos segmentos más los del prefijo al inicio
+    extra = scope["path"].count("/") - template.count("/")
+    if extra > 0:
+        template = "/".join(scope["path"].split("/")[:extra + 1]) + template
+    return template
+
+
+class MetricsMiddleware:
+    """Debe ser el middleware más externo para medir también ETag y compresión."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+        size = {"bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                length = MutableHeaders(raw=message["headers"]).get("content-length")
+                if length is not None:
+                    size["bytes"] = int(length)
+                    size["fixed"] = True
+            elif message["type"] == "http.response.body" and not size.get("fixed"):
+                size["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = _route_label(scope)
+            code = str(status["code"])
+            HTTP_REQUESTS.inc(method=method, route=route, status=code)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route, status=code)
+            HTTP_RESPONSE_SIZE.observe(size["bytes"], method=method, route=route)
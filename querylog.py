@@ -0,0 +1,188 @@
+# querylog.py
+# Log de consultas lentas de BD1 y estadísticas por sentencia.
+#   - Cada execute de TimedCursor (database.py) pasa por record().
+#   - Por encima de DB1_SLOW_QUERY_MS se imprime la sentencia con los valores redactados.
+#   - Una muestra (DB1_EXPLAIN_SAMPLE_RATE) de las lentas de solo lectura se vuelve a
+#     ejecutar con EXPLAIN (ANALYZE, BUFFERS) y el plan se guarda en DB1_EXPLAIN_LOG.
+#   - top_queries(): sentencias ordenadas por tiempo total (endpoint de debug).
+
+import json
+import os
+import random
+import re
+import threading
+from datetime import datetime, timezone
+from psycopg2 import extensions
+
+DB1_SLOW_QUERY_MS = float(os.getenv("DB1_SLOW_QUERY_MS", "200"))
+# 0 = nunca EXPLAIN; 1 = todas las lentas. EXPLAIN ANALYZE repite la consulta.
+DB1_EXPLAIN_SAMPLE_RATE = float(os.getenv("DB1_EXPLAIN_SAMPLE_RATE", "0"))
+DB1_EXPLAIN_LOG = os.getenv("DB1_EXPLAIN_LOG", "slow_queries.jsonl")
+# Sentencias distintas que se guardan (se descarta la de menor tiempo total)
+QUERY_STATS_MAX_ENTRIES = int(os.getenv("QUERY_STATS_MAX_ENTRIES", "500"))
+
+
+# =====================================================
+#   NORMALIZACIÓN / REDACCIÓN
+# =====================================================
+
+# execute_values y mogrify dejan los valores incrustados en el SQL: se quitan
+# los literales para que no salgan en el log y para agrupar por forma
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?\b")
+_VALUES_LIST = re.compile(r"(\(\?(?:,\s*\?)*\))(?:\s*,\s*\(\?(?:,\s*\?)*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    query = _STRING_LITERAL.sub("?", str(query))
+    query = _NUMBER_LITERAL.sub("?", query)
+    # VALUES (?, ?), (?, ?), ... -> VALUES (?, ?), ...
+    query = _VALUES_LIST.sub(r"\1, ...", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _redact_value(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(params):
+    """Solo tipos y longitudes: ni contraseñas ni datos de usuarios en el log."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: _redact_value(v) for k, v in params.items()}
+    return [_redact_value(v) for v in params]
+
+
+# =====================================================
+#   ESTADÍSTICAS
+# =====================================================
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _update_stats(fingerprint: str, elapsed_ms: float, rows: int, slow: bool):
+    with _lock:
+        entry = _stats.get(fingerprint)
+        if entry is None:
+            if len(_stats) >= QUERY_STATS_MAX_ENTRIES:
+                smallest = min(_stats, key=lambda k: _stats[k]["total_ms"])
+                del _stats[smallest]
+            entry = _stats[fingerprint] = {
+                "query": fingerprint, "calls": 0, "slow_calls": 0,
+                "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "last_plan": None,
+            }
+        entry["calls"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["rows"] += max(rows, 0)
+        if slow:
+            entry["slow_calls"] += 1
+
+
+def top_queries(limit: int = 20, order_by: str = "total_ms") -> list:
+    with _lock:
+        entries = [dict(e) for e in _stats.values()]
+    for e in entries:
+        e["mean_ms"] = round(e["total_ms"] / e["calls"], 3)
+        e["total_ms"] = round(e["total_ms"], 3)
+        e["max_ms"] = round(e["max_ms"], 3)
+    entries.sort(key=lambda e: e[order_by], reverse=True)
+    return entries[:limit]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+# =====================================================
+#   EXPLAIN (ANALYZE, BUFFERS)
+# =====================================================
+
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.I)
+_WRITE_IN_CTE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.I)
+_file_lock = threading.Lock()
+
+
+def _is_read_only(query: str) -> bool:
+    # ANALYZE ejecuta de verdad la sentencia: nunca se repite una escritura
+    return bool(_READ_ONLY.match(query)) and not _WRITE_IN_CTE.search(query)
+
+
+def _explain(cursor, query, params):
+    """
+    Corre EXPLAIN en un cursor aparte (sin medir) de la misma conexión. Dentro
+    de una transacción va en un SAVEPOINT para que un error no la deje abortada.
+    """
+    conn = cursor.connection
+    savepoint = not conn.autocommit
+    with conn.cursor(cursor_factory=extensions.cursor) as cur:
+        try:
+            if savepoint:
+                cur.execute("SAVEPOINT querylog_explain")
+            cur.execute(b"EXPLAIN (ANALYZE, BUFFERS) " + _as_bytes(query), params)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+            if savepoint:
+                cur.execute("RELEASE SAVEPOINT querylog_explain")
+            return plan
+        except Exception as e:
+            if savepoint:
+                try:
+                    cur.execute("ROLLBACK TO SAVEPOINT querylog_explain")
+                except Exception:
+                    pass
+            return f"EXPLAIN falló: {e}"
+
+
+def _as_bytes(query) -> bytes:
+    return query if isinstance(query, bytes) else str(query).encode("utf-8")
+
+
+def _write_plan(record: dict):
+    try:
+        with _file_lock, open(DB1_EXPLAIN_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Advertencia: no se pudo escribir el plan en {DB1_EXPLAIN_LOG} ({e})")
+
+
+# =====================================================
+#   ENTRADA DESDE EL CURSOR
+# =====================================================
+
+def record(cursor, query, params, elapsed: float):
+    elapsed_ms = elapsed * 1000
+    fingerprint = normalize(query)
+    slow = elapsed_ms >= DB1_SLOW_QUERY_MS
+    _update_stats(fingerprint, elapsed_ms, cursor.rowcount, slow)
+    if not slow:
+        return
+
+    print(f"[BD1 lenta] {elapsed_ms:.1f} ms | {fingerprint} | params={redact_params(params)}")
+
+    if DB1_EXPLAIN_SAMPLE_RATE <= 0 or random.random() >= DB1_EXPLAIN_SAMPLE_RATE:
+        return
+    if not _is_read_only(fingerprint):
+        return
+    plan = _explain(cursor, query, params)
+    with _lock:
+        if fingerprint in _stats:
+            _stats[fingerprint]["last_plan"] = plan
+    _write_plan({
+        "at": datetime.now(timezone.utc).isoformat(),
+        "elapsed_ms": round(elapsed_ms, 3),
+        "query": fingerprint,
+        "params": redact_params(params),
+        "plan": plan,
+    })
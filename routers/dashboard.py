@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends
-from database import get_supabase
-import re
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from database import fan_out, get_db1, get_supabase_async, run_db1
 from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+import asyncio
+import os
+import crud
+import faq
+from responses import FastJSONResponse
 
 router = APIRouter(
     prefix="/dashboard",
@@ -11,85 +18,195 @@ router = APIRouter(
 # ==================================================
 # 1) KPIs DEL DASHBOARD
 # ==================================================
+# Snapshot en memoria refrescado en segundo plano: cada hit es O(1)
+DASHBOARD_STATS_REFRESH = float(os.getenv("DASHBOARD_STATS_REFRESH", "60"))
+
+_stats_snapshot = {"data": None, "refreshed_at": None}
+_stats_lock = asyncio.Lock()
+
+async def _load_dashboard_stats():
+    # Una sola sentencia (CTEs) en una conexión propia del pool
+    return await run_db1(crud.get_dashboard_stats)
+
+async def refresh_dashboard_stats(only_if_missing: bool = False):
+    async with _stats_lock:
+        if only_if_missing and _stats_snapshot["data"] is not None:
+            return _stats_snapshot
+        data = await _load_dashboard_stats()
+        _stats_snapshot["data"] = data
+        _stats_snapshot["refreshed_at"] = datetime.now(timezone.utc).isoformat()
+    return _stats_snapshot
+
+async def dashboard_stats_refresher():
+    """Tarea de fondo (se lanza en el lifespan de main.py)."""
+    while True:
+        try:
+            await refresh_dashboard_stats()
+        except Exception as e:
+            print(f"Advertencia: no se pudieron refrescar los KPIs del dashboard ({e})")
+        await asyncio.sleep(DASHBOARD_STATS_REFRESH)
+
 @router.get("/stats/")
-def get_dashboard_stats():
-    return {
-        "total_projects": 12,
-        "available_units": 54,
-        "sold_units": 33,
-        "total_zones": 7
-    }
+async def get_dashboard_stats():
+    if _stats_snapshot["data"] is None:
+        await refresh_dashboard_stats(only_if_missing=True)
+    return {**_stats_snapshot["data"], "refreshed_at": _stats_snapshot["refreshed_at"]}
 
 
 # ==================================================
-# 2) MENSAJES POR DÍA
+# ACTIVIDAD RECIENTE (paginada; `since` para pedir solo novedades)
 # ==================================================
-@router.get("/whatsapp/daily/")
-def get_whatsapp_messages_by_day(conn = Depends(get_supabase)):
-    rows = conn("historial_conversaciones_diarias")
-
-    contador = {}
-    for row in rows:
-        fecha = row.get("fecha")
-        if fecha:
-            contador[fecha] = contador.get(fecha, 0) + 1
-
-    return [
-        {"fecha": fecha, "total": total}
-        for fecha, total in sorted(contador.items())
-    ]
+@router.get("/activity/")
+@router.get("/activity", include_in_schema=False)
+async def get_activity_feed(limit: int = Query(10, ge=1, le=100), since: Optional[datetime] = None,
+                            cursor: Optional[str] = None, db = Depends(get_db1)):
+    rows = await run_in_threadpool(crud.get_recent_activity, db, limit, since, cursor)
+    latest = rows[0]["timestamp"] if rows else since
+    return {"items": rows, "next_cursor": crud.activity_cursor(rows, limit), "latest": latest}
 
 
 # ==================================================
-# 3) MENSAJES POR USUARIO
+# AGREGADOS DE WHATSAPP EN UNA SOLA PASADA
 # ==================================================
-@router.get("/whatsapp/by-user/")
-def get_messages_by_user(conn = Depends(get_supabase)):
-    rows = conn("historial_conversaciones_diarias")
+HISTORIAL_TABLE = "historial_conversaciones_diarias"
+
+WHATSAPP_SECTIONS = ("daily", "by_user", "faq")
+
+# Solo se descargan las columnas que usa cada sección
+_SECTION_COLUMNS = {
+    "daily": ("fecha",),
+    "by_user": ("nombreusuario", "idusuario"),
+    "faq": ("historial_conversacion",),
+}
+
+class WhatsappStats:
+    """
+    Acumula conteos por día, por usuario y de palabras recorriendo las filas una vez.
+    `sections` limita qué se calcula (p. ej. solo "daily" no tokeniza mensajes).
+    """
+
+    def __init__(self, sections=WHATSAPP_SECTIONS):
+        self.sections = set(sections)
+        self.por_dia = Counter()
+        self.por_usuario = Counter()
+        self.palabras = Counter()
+
+    def add(self, row: dict):
+        if "daily" in self.sections:
+            fecha = row.get("fecha")
+            if fecha:
+                self.por_dia[fecha] += 1
+
+        if "by_user" in self.sections:
+            usuario = row.get("nombreusuario") or row.get("idusuario")
+            if usuario:
+                self.por_usuario[usuario] += 1
+
+        if "faq" in self.sections:
+            contenido = row.get("historial_conversacion")
+            if contenido:
+                self.palabras.update(faq.iter_terms(contenido))
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def daily(self):
+        return [
+            {"fecha": fecha, "total": total}
+            for fecha, total in sorted(self.por_dia.items())
+        ]
+
+    def by_user(self):
+        return [
+            {"usuario": usuario, "total": total}
+            for usuario, total in sorted(self.por_usuario.items(), key=lambda x: -x[1])
+        ]
+
+    def faq(self, top: int = 15):
+        return [
+            {"palabra": palabra, "total": total}
+            for palabra, total in self.palabras.most_common(top)
+        ]
+
+    def summary(self, top: int = 15):
+        return {"daily": self.daily(), "by_user": self.by_user(), "faq": self.faq(top)}
+
+
+async def _whatsapp_stats(conn, sections=WHATSAPP_SECTIONS) -> WhatsappStats:
+    stats = WhatsappStats(sections)
+    columns = [c for section in sections for c in _SECTION_COLUMNS[section]]
+    # Por páginas: una sola GET se corta en max-rows
+    async for rows in faq.iter_message_pages(conn, HISTORIAL_TABLE, {"select": ",".join(columns)}):
+        # Tokenizar es CPU: fuera del event loop
+        await run_in_threadpool(stats.add_rows, rows)
+    return stats
+
+
+def _faq_range(days: Optional[int], date_from: Optional[date], date_to: Optional[date]):
+    if days:
+        return date.today() - timedelta(days=days - 1), date_to
+    return date_from, date_to
+
+
+async def _faq_from_index(conn, top: int, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    # Sin la conexión de la petición: corre bajo fan_out y puede abandonarse
+    # por plazo, así que BD1 se usa solo vía run_db1 (conexión propia del hilo)
+    await faq.refresh_index(conn, HISTORIAL_TABLE)
+    return await run_db1(faq.top_terms, top, date_from, date_to)
 
-    contador = {}
-    for row in rows:
-        usuario = row.get("nombreusuario") or row.get("idusuario")
-        if usuario:
-            contador[usuario] = contador.get(usuario, 0) + 1
 
-    return [
-        {"usuario": usuario, "total": total}
-        for usuario, total in sorted(contador.items(), key=lambda x: -x[1])
-    ]
+# ==================================================
+# 2) RESUMEN COMBINADO (daily + by-user + faq)
+#    Una sola descarga (sin texto) + FAQ desde el índice por día
+# ==================================================
+@router.get("/whatsapp/summary/")
+async def get_whatsapp_summary(conn = Depends(get_supabase_async), top: int = 15):
+    # Descarga de mensajes e índice FAQ son independientes: en paralelo
+    stats, faq_terms = await fan_out(_whatsapp_stats(conn, ("daily", "by_user")),
+                                     _faq_from_index(conn, top))
+    return FastJSONResponse({"daily": stats.daily(), "by_user": stats.by_user(), "faq": faq_terms})
 
 
 # ==================================================
-# 4) FAQ (PREGUNTAS FRECUENTES)
+# 3) MENSAJES POR DÍA
+#    combined=true devuelve daily + by_user + faq en una pasada
 # ==================================================
-@router.get("/whatsapp/faq/")
-def get_faq_from_messages(conn = Depends(get_supabase), top: int = 15):
-
-    rows = conn("historial_conversaciones_diarias")
+@router.get("/whatsapp/daily/")
+async def get_whatsapp_messages_by_day(conn = Depends(get_supabase_async), combined: bool = False, top: int = 15):
+    stats = await _whatsapp_stats(conn, WHATSAPP_SECTIONS if combined else ("daily",))
+    return FastJSONResponse(stats.summary(top) if combined else stats.daily())
 
-    texto_total = ""
-    for row in rows:
-        contenido = row.get("historial_conversacion", "")
-        if contenido:
-            texto_total += " " + contenido.lower()
 
-    texto_total = re.sub(r"[^a-zA-Z0-9áéíóúñü ]", " ", texto_total)
-    palabras = texto_total.split()
+# ==================================================
+# 4) MENSAJES POR USUARIO
+# ==================================================
+@router.get("/whatsapp/by-user/")
+async def get_messages_by_user(conn = Depends(get_supabase_async), combined: bool = False, top: int = 15):
+    stats = await _whatsapp_stats(conn, WHATSAPP_SECTIONS if combined else ("by_user",))
+    return FastJSONResponse(stats.summary(top) if combined else stats.by_user())
 
-    stopwords = {
-        "hola","buenas","gracias","por","favor","ok","si","de","la","el","y","a","en",
-        "que","se","lo","me","es","un","una","para","tu","mi","los","las","del"
-    }
 
-    palabras_filtradas = [p for p in palabras if p not in stopwords and len(p) > 3]
+# ==================================================
+# 5) FAQ (PREGUNTAS FRECUENTES)
+#    Servido desde faq_term_daily; days=7 -> últimos 7 días
+# ==================================================
+@router.get("/whatsapp/faq/")
+async def get_faq_from_messages(conn = Depends(get_supabase_async), top: int = 15,
+                                days: Optional[int] = Query(None, ge=1), date_from: Optional[date] = None,
+                                date_to: Optional[date] = None, combined: bool = False):
+    date_from, date_to = _faq_range(days, date_from, date_to)
+    if not combined:
+        return FastJSONResponse(await _faq_from_index(conn, top, date_from, date_to))
+    stats, terms = await fan_out(_whatsapp_stats(conn, ("daily", "by_user")),
+                                 _faq_from_index(conn, top, date_from, date_to))
+    return FastJSONResponse({"daily": stats.daily(), "by_user": stats.by_user(), "faq": terms})
 
-    conteo = Counter(palabras_filtradas)
 
-    return [
-        {"palabra": palabra, "total": total}
-        for palabra, total in conteo.most_common(top)
-    ]
+@router.post("/whatsapp/faq/refresh/")
+async def refresh_faq_index(conn = Depends(get_supabase_async)):
+    return await faq.refresh_index(conn, HISTORIAL_TABLE, force=True)
 
 @router.get("/whatsapp/last/")
-def placeholder_last_messages():
+async def placeholder_last_messages():
     return []
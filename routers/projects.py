@@ -1,12 +1,14 @@
 # archivo: routers/projects.py (ACTUALIZADO CON 'PUT')
 
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 import uuid
 from uuid import UUID
 import schemas
 import crud
-from database import get_db1
+from database import get_db1, get_db3_async
+from responses import FastJSONResponse
 
 router = APIRouter(
     prefix="/projects",
@@ -17,9 +19,54 @@ router = APIRouter(
 def create_project_endpoint(project: schemas.ProjectCreate, conn = Depends(get_db1)):
     return crud.create_project(conn=conn, project=project)
 
+# --- LOTES: un solo INSERT/UPDATE multi-fila en una transacción ---
+@router.post("/batch", response_model=List[schemas.ProjectWithZone], status_code=201)
+def create_projects_batch_endpoint(projects: List[schemas.ProjectCreate], conn = Depends(get_db1)):
+    return crud.create_projects(conn=conn, projects=projects)
+
+@router.patch("/batch", response_model=List[schemas.ProjectWithZone])
+def update_projects_batch_endpoint(projects: List[schemas.ProjectBatchUpdate], conn = Depends(get_db1)):
+    return crud.update_projects(conn=conn, projects=projects)
+
 @router.get("/", response_model=List[schemas.ProjectWithZone])
-def read_projects_endpoint(skip: int = 0, limit: int = 100, conn = Depends(get_db1)):
-    return crud.get_projects(conn=conn, skip=skip, limit=limit)
+def read_projects_endpoint(response: Response, skip: int = 0, limit: int = 100,
+                           cursor: Optional[str] = None, search: str = "", prefix: bool = False,
+                           conn = Depends(get_db1)):
+    # cursor (de X-Next-Cursor) pagina por keyset; skip queda para clientes viejos
+    # search: búsqueda por nombre en el servidor, ordenada por relevancia
+    rows = crud.get_projects(conn=conn, skip=skip, limit=limit, search=search, cursor=cursor, prefix=prefix)
+    if search:
+        return rows
+    next_cursor = crud.page_cursor(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# --- RESUMEN: proyectos de BD1 + agregados de sus unidades (Supabase2) ---
+# Misma paginación que el listado; los agregados salen de un select agrupado
+# por proyecto (o de la caché) y se unen por id en memoria.
+# Con barra final, como los demás listados: apiRequest la agrega siempre.
+# Sin barra también (si no, caería en /{project_id} con 422)
+@router.get("/summary/")
+@router.get("/summary", include_in_schema=False)
+async def read_projects_summary_endpoint(skip: int = 0, limit: int = 100,
+                                         cursor: Optional[str] = None, search: str = "", prefix: bool = False,
+                                         conn = Depends(get_db1), units_conn = Depends(get_db3_async)):
+    rows = await run_in_threadpool(crud.get_projects, conn=conn, skip=skip, limit=limit,
+                                   search=search, cursor=cursor, prefix=prefix)
+    try:
+        stats = await crud.get_unit_stats_by_projects(units_conn, [row["id"] for row in rows])
+    except HTTPException as e:
+        # Sin Supabase2 (error o 504 de fan_out) el listado sigue cargando: agregados en null
+        print(f"Advertencia: sin agregados de unidades para el resumen de proyectos ({e.status_code}: {e.detail})")
+        stats = {str(row["id"]): crud.unknown_unit_stats() for row in rows}
+    summary = [{**row, **stats[str(row["id"])]} for row in rows]
+
+    headers = {}
+    next_cursor = None if search else crud.page_cursor(rows, limit)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(summary, headers=headers)
 
 @router.get("/{project_id}", response_model=schemas.ProjectWithZone)
 def read_project_endpoint(project_id: UUID, conn = Depends(get_db1)):
@@ -29,20 +76,17 @@ def read_project_endpoint(project_id: UUID, conn = Depends(get_db1)):
     return db_project
 
 # --- NUEVO ENDPOINT PARA ACTUALIZAR (EDITAR) ---
+# Un solo UPDATE ... RETURNING: si no afectó filas, el proyecto no existe
 @router.put("/{project_id}", response_model=schemas.ProjectWithZone)
 def update_project_endpoint(project_id: UUID, project: schemas.ProjectUpdate, conn = Depends(get_db1)):
-    db_project = crud.get_project(conn=conn, project_id=project_id)
+    db_project = crud.update_project(conn=conn, project_id=project_id, project=project)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    return crud.update_project(conn=conn, project_id=project_id, project=project)
+    return db_project
 
 # --- ENDPOINT PARA ELIMINAR PROYECTO ---
 @router.delete("/{project_id}")
 def delete_project_endpoint(project_id: UUID, conn = Depends(get_db1)):
-    db_project = crud.get_project(conn=conn, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
     deleted_count = crud.delete_project(conn=conn, project_id=project_id)
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -1,42 +1,110 @@
 # routers/units.py
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import csv
+import io
+import json
 import uuid
 import crud
 import schemas
-from database import get_db3
+from database import get_db3_async
+from responses import FastJSONResponse, dumps
 
 router = APIRouter(prefix="/units", tags=["Units"])
 
 @router.get("/")
-def get_units(skip: int = 0, limit: int = 1000, conn=Depends(get_db3)):
-    try:
-        result = crud.get_all_units(conn, skip, limit)
-        print(f"Result type: {type(result)}")
-        print(f"Result: {result}")
-        return result
-    except Exception as e:
-        print(f"Error en get_units: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
+async def get_units(skip: int = 0, limit: int = 1000,
+                    cursor: Optional[str] = None, conn=Depends(get_db3_async)):
+    # Latencia, tamaño y tiempo en Supabase de esta ruta: ver /metrics
+    result, total, next_cursor = await crud.get_units_page(conn, skip, limit, cursor)
+    headers = {}
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    # Respuesta directa: se serializa una vez con orjson, sin jsonable_encoder
+    return FastJSONResponse(result, headers=headers)
+
+# Exportación en streaming: memoria constante, el primer chunk sale
+# antes de pedir la siguiente página a PostgREST
+async def _ndjson_chunks(pages):
+    async for rows in pages:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+async def _csv_chunks(pages):
+    writer = None
+    buffer = io.StringIO()
+    async for rows in pages:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+@router.get("/export")
+async def export_units(format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                       project_id: Optional[uuid.UUID] = None,
+                       chunk_size: int = Query(1000, ge=1, le=10000),
+                       conn=Depends(get_db3_async)):
+    pages = crud.iter_units(conn, str(project_id) if project_id else None, chunk_size)
+    if format == "csv":
+        body, media_type = _csv_chunks(pages), "text/csv"
+    else:
+        body, media_type = _ndjson_chunks(pages), "application/x-ndjson"
+    filename = f"units_{project_id}.{format}" if project_id else f"units.{format}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Unidades de muchos proyectos de una vez (evita N llamadas a /project/{id})
+UNITS_BY_PROJECTS_MAX_IDS = 1000
+
+@router.get("/by-projects")
+async def get_units_by_projects(ids: List[str] = Query(..., description="UUIDs separados por coma"),
+                                conn=Depends(get_db3_async)):
+    project_ids = [p.strip() for value in ids for p in value.split(",") if p.strip()]
+    if len(project_ids) > UNITS_BY_PROJECTS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {UNITS_BY_PROJECTS_MAX_IDS} proyectos por petición")
+    return FastJSONResponse(await crud.get_units_by_projects(conn, project_ids))
 
 @router.get("/{unit_id}")
-def get_unit(unit_id: uuid.UUID, conn=Depends(get_db3)):
-    return crud.get_unit(conn, str(unit_id))
+async def get_unit(unit_id: uuid.UUID, conn=Depends(get_db3_async)):
+    return await crud.get_unit(conn, str(unit_id))
 
 @router.get("/project/{project_id}")
-def get_units_by_project(project_id: uuid.UUID, conn=Depends(get_db3)):
-    return crud.get_units_by_project(conn, str(project_id))
+async def get_units_by_project(project_id: uuid.UUID, conn=Depends(get_db3_async)):
+    return await crud.get_units_by_project(conn, str(project_id))
 
 @router.post("/")
-def create_unit(unit: schemas.UnitCreate, conn=Depends(get_db3)):
-    return crud.create_unit(conn, unit)
+async def create_unit(unit: schemas.UnitCreate, conn=Depends(get_db3_async)):
+    return await crud.create_unit(conn, unit)
+
+# Importación masiva: JSON (arreglo de unidades) o CSV (Content-Type: text/csv)
+@router.post("/bulk")
+async def bulk_import_units(request: Request,
+                            chunk_size: int = Query(crud.UNITS_BULK_CHUNK_SIZE, ge=1, le=5000),
+                            upsert: bool = False, conn=Depends(get_db3_async)):
+    content_type = request.headers.get("content-type", "")
+    body = await request.body()
+    if "csv" in content_type:
+        reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        rows = [{k: (v if v != "" else None) for k, v in row.items()} for row in reader]
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    return await crud.bulk_create_units(conn, rows, chunk_size=chunk_size, upsert=upsert)
 
 @router.patch("/{unit_id}")
-def update_unit(unit_id: uuid.UUID, unit: schemas.UnitUpdate, conn=Depends(get_db3)):
-    return crud.update_unit(conn, str(unit_id), unit)
+async def update_unit(unit_id: uuid.UUID, unit: schemas.UnitUpdate, conn=Depends(get_db3_async)):
+    return await crud.update_unit(conn, str(unit_id), unit)
 
 @router.delete("/{unit_id}")
-def delete_unit(unit_id: uuid.UUID, conn=Depends(get_db3)):
-    return crud.delete_unit(conn, str(unit_id))
+async def delete_unit(unit_id: uuid.UUID, conn=Depends(get_db3_async)):
+    return await crud.delete_unit(conn, str(unit_id))
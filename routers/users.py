@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import List, Optional
 import schemas
 import crud
 from database import get_db1
@@ -16,8 +16,13 @@ def create_user_endpoint(user: schemas.UserCreate, conn = Depends(get_db1)):
 
 # Obtener lista de usuarios
 @router.get("/", response_model=List[schemas.User])
-def read_users_endpoint(skip: int = 0, limit: int = 100, role: str = "", conn = Depends(get_db1)):
-    return crud.get_users(conn=conn, skip=skip, limit=limit, role_filter=role)
+def read_users_endpoint(response: Response, skip: int = 0, limit: int = 100, role: str = "",
+                        cursor: Optional[str] = None, conn = Depends(get_db1)):
+    rows = crud.get_users(conn=conn, skip=skip, limit=limit, role_filter=role, cursor=cursor)
+    next_cursor = crud.page_cursor(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 # Obtener un usuario por ID
 @router.get("/{user_id}", response_model=schemas.User)
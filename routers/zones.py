@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import List, Optional
 from uuid import UUID
 import schemas
 import crud
@@ -14,9 +14,23 @@ router = APIRouter(
 def create_zone_endpoint(zone: schemas.ZoneCreate, conn = Depends(get_db1)):
     return crud.create_zone(conn=conn, zone=zone)
 
+# --- LOTES: un solo INSERT/UPDATE multi-fila en una transacción ---
+@router.post("/batch", response_model=List[schemas.Zone], status_code=201)
+def create_zones_batch_endpoint(zones: List[schemas.ZoneCreate], conn = Depends(get_db1)):
+    return crud.create_zones(conn=conn, zones=zones)
+
+@router.patch("/batch", response_model=List[schemas.Zone])
+def update_zones_batch_endpoint(zones: List[schemas.ZoneBatchUpdate], conn = Depends(get_db1)):
+    return crud.update_zones(conn=conn, zones=zones)
+
 @router.get("/", response_model=List[schemas.Zone])
-def read_zones_endpoint(skip: int = 0, limit: int = 100, conn = Depends(get_db1)):
-    return crud.get_zones(conn=conn, skip=skip, limit=limit)
+def read_zones_endpoint(response: Response, skip: int = 0, limit: int = 100,
+                        cursor: Optional[str] = None, conn = Depends(get_db1)):
+    rows = crud.get_zones(conn=conn, skip=skip, limit=limit, cursor=cursor)
+    next_cursor = crud.page_cursor(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @router.get("/{zone_id}", response_model=schemas.Zone)
 def read_zone_endpoint(zone_id: UUID, conn = Depends(get_db1)):
@@ -23,6 +23,9 @@ class ZoneUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
 
+class ZoneBatchUpdate(ZoneUpdate):
+    id: int
+
 class Zone(ZoneBase, BaseSchema):
     id: int
     project_count: Optional[int] = 0
@@ -44,6 +47,9 @@ class ProjectUpdate(BaseModel):
     general_field_id: Optional[str] = None
     prices_field_id: Optional[str] = None
 
+class ProjectBatchUpdate(ProjectUpdate):
+    id: int
+
 class Project(ProjectBase, BaseSchema):
     id: int
 
@@ -63,7 +63,10 @@ const API_BASE_URL = '/api';
 async function apiRequest(url, options = {}) {
     try {
         // Asegurar que la URL termine con / para evitar redirects
-        const finalUrl = url.endsWith('/') ? API_BASE_URL + url : API_BASE_URL + url + '/';
+        // (la barra va antes del query string: /projects/?search=...)
+        const [path, query] = url.split('?');
+        const finalPath = path.endsWith('/') ? path : path + '/';
+        const finalUrl = API_BASE_URL + finalPath + (query ? '?' + query : '');
 
         const response = await fetch(finalUrl, {
             headers: {
@@ -9,7 +9,7 @@ async function loadDashboard() {
     allProjects = [];
 
     try {
-        // 1) KPI FAKE TEMPORAL - NO BORRAR
+        // 1) KPIs (snapshot refrescado en el backend)
         const stats = await apiRequest('/dashboard/stats/');
         if (stats) {
             totalProjectsEl.textContent = stats.total_projects;
@@ -18,14 +18,12 @@ async function loadDashboard() {
             totalZonesEl.textContent = stats.total_zones;
         }
 
-        // 2) WHATSAPP: mensajes por día
-        const daily = await apiRequest('/dashboard/whatsapp/daily/');
-
-        // 3) WHATSAPP: mensajes por usuario
-        const byUser = await apiRequest('/dashboard/whatsapp/by-user/');
-
-        // 4) WHATSAPP: palabras frecuentes
-        const faq = await apiRequest('/dashboard/whatsapp/faq/');
+        // 2-4) WHATSAPP: mensajes por día, por usuario y palabras frecuentes
+        //      (una sola petición; el backend lee la tabla una vez)
+        const summary = await apiRequest('/dashboard/whatsapp/summary/');
+        const daily = summary.daily;
+        const byUser = summary.by_user;
+        const faq = summary.faq;
 
         // 5) WHATSAPP: últimos mensajes
         const last = await apiRequest('/dashboard/whatsapp/last/');
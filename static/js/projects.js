@@ -30,7 +30,7 @@ function renderProjects(filteredProjects = null) {
             </td>
             <td class="px-4 py-4 text-center">
                 <span class="px-2 py-1 bg-blue-500/20 text-blue-300 rounded-full text-xs font-medium">
-                    ${project.total_units || 0}
+                    ${project.unit_count ?? project.total_units ?? 0}
                 </span>
             </td>
             <td class="px-4 py-4">
@@ -68,7 +68,8 @@ async function loadProjects() {
     if (noProjects) noProjects.style.display = 'none';
 
     try {
-        projects = await apiRequest('/projects');
+        // Resumen: proyectos + conteos de unidades agregados en el servidor
+        projects = await apiRequest('/projects/summary');
         renderProjects();
     } catch (error) {
         console.error('Error loading projects:', error);
@@ -78,19 +79,25 @@ async function loadProjects() {
     }
 }
 
+// Búsqueda por nombre, desarrollador o zona en el servidor (índices trigram), con debounce
+let projectSearchTimer = null;
+
 function filterProjects(searchTerm) {
+    clearTimeout(projectSearchTimer);
     if (!searchTerm) {
         renderProjects();
         return;
     }
 
-    const filtered = projects.filter(project =>
-        (project.name || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-        (project.developer || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-        (project.zone_name || '').toLowerCase().includes(searchTerm.toLowerCase())
-    );
-
-    renderProjects(filtered);
+    projectSearchTimer = setTimeout(async () => {
+        try {
+            const results = await apiRequest(`/projects/summary?search=${encodeURIComponent(searchTerm)}`);
+            renderProjects(results);
+        } catch (error) {
+            console.error('Error searching projects:', error);
+            showError('Error al buscar proyectos');
+        }
+    }, 250);
 }
 
 // Modal y CRUD